@@ -1,7 +1,7 @@
 """This module represent a data client that can request pseudonyms from a server"""
-from typing import Dict, List, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+import json
 import pickle
-import requests
 from charm.toolbox.symcrypto import SymmetricCryptoAbstraction
 from charm.toolbox.pairinggroup import extract_key
 from fastapi import FastAPI, HTTPException
@@ -9,9 +9,13 @@ from fastapi.middleware.cors import CORSMiddleware
 from util import generate_wildcard_list
 
 from models import PseudonymRequest, SecurityDetails
-from constants import GROUP, API_URL, MY_ID
-from se import write, construct_query
-from db import DB
+from constants import GROUP, API_URL, MY_ID, HTTP_TIMEOUT, HTTP_STREAM_TIMEOUT
+from se import write, construct_serialized_query
+from se import query_cache
+from security_details import UserDetails, require_details, store_details
+from http_client import session, close_clients
+from http_client import statistics as connection_statistics
+from single_flight import request_key, run_once
 
 app = FastAPI()
 origins = ["*"]
@@ -25,6 +29,12 @@ app.add_middleware(
 )
 
 
+@app.on_event("shutdown")
+async def close_connections():
+    """Closes the pooled connections to the vault"""
+    await close_clients()
+
+
 @app.put("/receiveSecurityDetails")
 def receive_security_details(details: SecurityDetails) -> int:
     """Endpoint to receive security details
@@ -44,22 +54,42 @@ def receive_security_details(details: SecurityDetails) -> int:
             status_code=400,
             detail="Security Details were not meant to be for this user",
         )
-    added_fields = DB.hset(
-        f"users:{MY_ID}",
-        mapping={
-            "queryKey": details.query_key,
-            "seed": f"{extract_key(GROUP.deserialize(details.seed, compression=False))}",
-            "encryptionKey": details.encryption_key,
-        },
+    return store_details(
+        details.query_key,
+        f"{extract_key(GROUP.deserialize(details.seed, compression=False))}",
+        details.encryption_key,
     )
-    return added_fields
+
+
+@app.get("/connectionStatistics")
+def get_connection_statistics() -> Dict[str, Union[int, float]]:
+    """Returns how many requests to the vault reused a kept alive connection
+
+    Returns:
+        Dict[str, Union[int, float]]: statistics of the pooled connections
+    """
+    return connection_statistics()
+
+
+@app.get("/cacheStatistics")
+def cache_statistics() -> Dict[str, Dict[str, Union[int, float]]]:
+    """Returns size and hit/miss counters of the cache of constructed queries
+
+    Returns:
+        Dict[str, Dict[str, Union[int, float]]]: statistics of the query cache
+    """
+    return {"queries": query_cache.statistics()}
 
 
 @app.post("/requestPseudonym")
 def request_pseudonym(record: PseudonymRequest) -> List[Tuple[Dict, str]]:
     """Requests a pseudonym for a given data record, if no entry on the server is found
     adds a new encrypted record to the server. If multiple records match, the user can choose the one
-    thats actually correct
+    thats actually correct. With a match limit the vault stops searching as soon as
+    that many records were found
+
+    Concurrent requests for the same keywords are answered by a single search,
+    so that a new record is only added once
 
     Args:
         record (PseudonymRequest): a given data record
@@ -67,43 +97,59 @@ def request_pseudonym(record: PseudonymRequest) -> List[Tuple[Dict, str]]:
     Returns:
         List[Tuple[Dict, str]]: a list containing pseudonyms and the matching record
     """
-    key: str = DB.hget(f"users:{MY_ID}", "encryptionKey")
-    if key is None:
-        raise HTTPException(status_code=400, detail="User has not been enrolled yet")
+    details = require_details()
     keywords = [record.data[key] for key in record.keywords if key in record.data]
-    matching_entries = search_for_record(keywords, record.is_fuzzy)
-    key = key.encode()
-    encrypter = SymmetricCryptoAbstraction(key)
-    if not matching_entries:
-        pseudonym, added_record = add_record(record, key, record.is_fuzzy)
-        data = []
-        data.append((pickle.loads(encrypter.decrypt(added_record)), pseudonym))
-        return data
+    key = request_key(details.seed, keywords, record.is_fuzzy, record.match_limit)
+    return run_once(key, lambda: find_or_add_record(record, keywords, details))
+
 
+def find_or_add_record(
+    record: PseudonymRequest, keywords: List[str], details: UserDetails
+) -> List[Tuple[Dict, str]]:
+    """Searches for a data record and adds it to the vault if no match was found
+
+    Args:
+        record (PseudonymRequest): a given data record
+        keywords (List[str]): the values of the keywords of the record
+        details (UserDetails): security details of this client
+
+    Returns:
+        List[Tuple[Dict, str]]: a list containing pseudonyms and the matching record
+    """
+    encrypter = SymmetricCryptoAbstraction(details.encryption_key)
+    # matches are decrypted while the vault is still streaming further matches
     decoded_data = [
-        (pickle.loads(encrypter.decrypt(word)), p) for word, p in matching_entries
+        (pickle.loads(encrypter.decrypt(word)), p)
+        for word, p in stream_search_for_record(
+            keywords, record.is_fuzzy, record.match_limit, details
+        )
     ]
+    if not decoded_data:
+        pseudonym, added_record = add_record(record, details, record.is_fuzzy)
+        data = []
+        data.append((pickle.loads(encrypter.decrypt(added_record)), pseudonym))
+        return data
     return decoded_data
 
 
 def add_record(
-    record: PseudonymRequest, enc_key: bytes, enable_fuzzy_search: bool
+    record: PseudonymRequest, details: UserDetails, enable_fuzzy_search: bool
 ) -> bool:
     """Add an encrypted record to the vault
 
     Args:
         record (PseudonymRequest): a pseudonym request
-        enc_key (bytes): an encryption key to encrypt documents
+        details (UserDetails): security details with the keys to encrypt documents
         enable_fuzzy_search (bool): if fuzzy indizes should be created
 
     Returns:
         bool: true if adding the record was successfull
     """
-    document = write(record, enc_key, enable_fuzzy_search)
-    response = requests.post(
+    document = write(record, details, enable_fuzzy_search)
+    response = session.post(
         f"{API_URL}/addRecord",
         json={"record": document[0], "indices": document[1]},
-        timeout=10,
+        timeout=HTTP_TIMEOUT,
     )
 
     if response.ok:
@@ -111,47 +157,54 @@ def add_record(
     raise HTTPException(status_code=503, detail=response.json())
 
 
-def search_for_record(keywords: List[str], fuzzy_search: bool) -> List:
-    """Searches for records in the vault and returns them if they match the search words
+def stream_search_for_record(
+    keywords: List[str],
+    fuzzy_search: bool,
+    limit: Optional[int] = None,
+    details: Optional[UserDetails] = None,
+) -> Iterator[Tuple[str, str]]:
+    """Searches for records in the vault and yields every match as soon as the vault
+    has streamed it
 
     Args:
         keywords (List[str]): a list of keywords to search for
         fuzzy_search (bool): if the search should be fuzzy
+        limit (Optional[int], optional): maximum amount of matches, the vault stops
+        searching once it is reached. Defaults to None, which finds all matches.
+        details (Optional[UserDetails], optional): security details to construct the
+        queries with. Defaults to None, which loads them.
 
-    Returns:
-        List: a list of matching records
+    Yields:
+        Iterator[Tuple[str, str]]: an encrypted matching record and its pseudonym
     """
-    query_key = DB.hget(f"users:{MY_ID}", "queryKey")
+    if details is None:
+        details = require_details()
     queries_list = []
     if fuzzy_search:
         wildcard_lists = generate_wildcard_list(keywords)
         for wildcard_list in wildcard_lists:
-            user_id, queries = construct_query(
-                GROUP.deserialize(query_key.encode(), compression=False), wildcard_list
+            user_id, serialized_queries = construct_serialized_query(
+                details, wildcard_list
             )
-            serialized_queries = [
-                GROUP.serialize(query, compression=False).decode() for query in queries
-            ]
             queries_list.append(serialized_queries)
     else:
-        user_id, queries = construct_query(
-            GROUP.deserialize(query_key.encode(), compression=False), keywords
-        )
-        serialized_queries = [
-            GROUP.serialize(query, compression=False).decode() for query in queries
-        ]
+        user_id, serialized_queries = construct_serialized_query(details, keywords)
         queries_list.append(serialized_queries)
 
-    response = requests.post(
-        f"{API_URL}/search",
+    with session.post(
+        f"{API_URL}/searchStream",
         json={
             "user_id": user_id,
             "queries": queries_list,
             "is_fuzzy": fuzzy_search,
             "expected_amount_of_keywords": len(keywords),
+            "limit": limit,
         },
-        timeout=20,
-    )
-    if response.ok:
-        return response.json()
-    raise HTTPException(status_code=503, detail=response.json())
+        timeout=HTTP_STREAM_TIMEOUT,
+        stream=True,
+    ) as response:
+        if not response.ok:
+            raise HTTPException(status_code=503, detail=response.json())
+        for line in response.iter_lines():
+            if line:
+                yield tuple(json.loads(line))
@@ -0,0 +1,119 @@
+"""Thread safe LRU cache with hit/miss counters and an optional memory budget"""
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Union
+
+
+class LRUCache:
+    """Least recently used cache with a maximum amount of entries
+    and optionally a maximum amount of bytes"""
+
+    def __init__(
+        self,
+        max_size: int,
+        max_bytes: int = 0,
+        size_of: Optional[Callable[[Hashable, Any], int]] = None,
+    ):
+        """
+        Args:
+            max_size (int): maximum amount of entries, 0 disables the cache
+            max_bytes (int, optional): maximum estimated size of all entries in bytes.
+            Defaults to 0, which only limits the amount of entries.
+            size_of (Optional[Callable[[Hashable, Any], int]], optional): estimates the
+            size of an entry in bytes, required for a memory budget. Defaults to None.
+        """
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size_of = size_of
+        self._bytes = 0
+        self._sizes: Dict[Hashable, int] = {}
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remove(self, key: Hashable):
+        del self._entries[key]
+        self._bytes -= self._sizes.pop(key, 0)
+
+    def _is_over_budget(self) -> bool:
+        return len(self._entries) > self.max_size or (
+            self.max_bytes > 0 and self._bytes > self.max_bytes
+        )
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Returns the cached value for a key and marks it as recently used
+
+        Args:
+            key (Hashable): key of the entry
+
+        Returns:
+            Optional[Any]: the cached value, None on a miss
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        """Adds an entry and evicts the least recently used entries if the cache is full
+
+        Args:
+            key (Hashable): key of the entry
+            value (Any): value to cache, must not be None
+        """
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = value
+            if self._size_of is not None:
+                self._sizes[key] = self._size_of(key, value)
+                self._bytes += self._sizes[key]
+            while self._entries and self._is_over_budget():
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Removes all entries whose key fulfills the predicate
+
+        Args:
+            predicate (Callable[[Hashable], bool]): check for the keys to remove
+
+        Returns:
+            int: the amount of removed entries
+        """
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def clear(self):
+        """Removes all entries"""
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._bytes = 0
+
+    def statistics(self) -> Dict[str, Union[int, float]]:
+        """Returns statistics about the cache
+
+        Returns:
+            Dict[str, Union[int, float]]: amount of entries, estimated size,
+            hits, misses and the hit rate
+        """
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "maxEntries": self.max_size,
+            "bytes": self._bytes,
+            "maxBytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": self.hits / lookups if lookups else 0.0,
+        }
@@ -10,3 +10,15 @@ MY_ID = int(os.environ.get("CLIENT_ID"))
 API_URL = os.environ.get("API_URL")
 UM_URL = os.environ.get("USER_MANAGER_URL")
 GROUP = PairingGroup(os.environ.get("PAIRING_GROUP"))
+LEGACY_INDEX_FORMAT = 1
+TAG_INDEX_FORMAT = 2
+# supported index formats, preferred format first
+INDEX_FORMATS = [TAG_INDEX_FORMAT, LEGACY_INDEX_FORMAT]
+INDEX_NONCE_LENGTH = 8
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", 10000))
+# connections kept alive per service and timeouts of requests in seconds
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", 10))
+HTTP_TIMEOUT = float(os.environ.get("HTTP_TIMEOUT", 10))
+HTTP_STREAM_TIMEOUT = float(os.environ.get("HTTP_STREAM_TIMEOUT", 20))
+# seconds a request for a record may block the same request on other workers
+REQUEST_LOCK_TIMEOUT = float(os.environ.get("REQUEST_LOCK_TIMEOUT", 30))
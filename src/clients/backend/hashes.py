@@ -1,7 +1,7 @@
 """This module provides hash functions that convert
 from or to a group Element to hashed value or new group element"""
 import hmac
-from hashlib import sha256
+from hashlib import blake2b, sha256
 from typing import Optional, Any
 from charm.toolbox.pairinggroup import PairingGroup, G1
 
@@ -29,8 +29,21 @@ def hs(
         pairing.Element: a group element of type elementType
     """
 
-    keyed_hashed_object = hmac.digest(seed, object_to_hash.encode(), sha256)
-    return group.hash(keyed_hashed_object, type=element_type)
+    return group.hash(keyword_digest(object_to_hash, seed), type=element_type)
+
+
+def keyword_digest(object_to_hash: Any, seed: Optional[str] = None) -> bytes:
+    """Keyed hash of a string that hs maps to a group element, it identifies
+    a keyword without revealing it
+
+    Args:
+        object_to_hash (Any): object to hash
+        seed (Optional[str], optional): A random seed. Defaults to None.
+
+    Returns:
+        bytes: the keyed hash
+    """
+    return hmac.digest(seed, object_to_hash.encode(), sha256)
 
 
 def h(group: PairingGroup, group_element: Any) -> bytes:
@@ -47,3 +60,16 @@ def h(group: PairingGroup, group_element: Any) -> bytes:
         bytes: a hashed group element
     """
     return sha256(group.serialize(group_element, compression=False)).digest()
+
+
+def index_tag(key: bytes, nonce: bytes) -> bytes:
+    """Keyed hash used as verification tag of an index entry.
+
+    Args:
+        key (bytes): a hashed group element, see h
+        nonce (bytes): the random nonce of the index entry
+
+    Returns:
+        bytes: a 16 byte tag
+    """
+    return blake2b(nonce, key=key, digest_size=16).digest()
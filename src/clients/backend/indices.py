@@ -0,0 +1,75 @@
+"""Creation of index entries in the format negotiated with the vault"""
+import os
+from base64 import b64encode
+from typing import Optional
+import requests
+from charm.toolbox.symcrypto import SymmetricCryptoAbstraction
+from constants import (
+    API_URL,
+    HTTP_TIMEOUT,
+    INDEX_FORMATS,
+    INDEX_NONCE_LENGTH,
+    LEGACY_INDEX_FORMAT,
+    TAG_INDEX_FORMAT,
+)
+from aliases import Index
+from hashes import index_tag
+from util import generate_random_string
+from http_client import session
+
+_negotiated_format: Optional[int] = None
+
+
+def negotiate_index_format() -> int:
+    """Asks the vault which index formats it can search and chooses the preferred one
+    both sides support. Vaults that can't answer only know the legacy format.
+    Only an answer of the vault is kept, after failures the vault is asked again
+
+    Returns:
+        int: the index format to use for new indices
+    """
+    global _negotiated_format  # pylint: disable=global-statement
+    if _negotiated_format is not None:
+        return _negotiated_format
+    try:
+        response = session.get(f"{API_URL}/indexFormats", timeout=HTTP_TIMEOUT)
+    except requests.RequestException:
+        return LEGACY_INDEX_FORMAT
+    if response.status_code == 404:
+        # vaults before the negotiation only search legacy indices
+        _negotiated_format = LEGACY_INDEX_FORMAT
+    elif not response.ok:
+        return LEGACY_INDEX_FORMAT
+    else:
+        vault_formats = response.json()
+        _negotiated_format = next(
+            (
+                index_format
+                for index_format in INDEX_FORMATS
+                if index_format in vault_formats
+            ),
+            LEGACY_INDEX_FORMAT,
+        )
+    return _negotiated_format
+
+
+def create_index(key: bytes, index_format: int) -> Index:
+    """Creates a single index entry for a keyword
+
+    Args:
+        key (bytes): the hashed group element derived for the keyword
+        index_format (int): the index format to use
+
+    Returns:
+        Index: the index entry, either a random and its encryption
+        or a nonce and its tag
+    """
+    if index_format == TAG_INDEX_FORMAT:
+        nonce = os.urandom(INDEX_NONCE_LENGTH)
+        return (
+            f"v{TAG_INDEX_FORMAT}:{b64encode(nonce).decode()}",
+            b64encode(index_tag(key, nonce)).decode(),
+        )
+    index_encrypter = SymmetricCryptoAbstraction(key)
+    res = generate_random_string(16)
+    return (res, index_encrypter.encrypt(res))
@@ -1,5 +1,5 @@
 """Models used for API"""
-from typing import Dict, List
+from typing import Dict, List, Optional
 from pydantic import BaseModel
 
 
@@ -10,6 +10,8 @@ class PseudonymRequest(BaseModel):
     data: Dict[str, str]
     keywords: List[str]
     is_fuzzy: bool
+    # only look for this many matching records, e.g. 1 to just check if a record exists
+    match_limit: Optional[int] = None
 
 
 class SecurityDetails(BaseModel):
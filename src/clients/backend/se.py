@@ -1,106 +1,168 @@
 """Provides operations for searchable encryption schema on the client side"""
-from typing import Any, List, Tuple
+from typing import List, Optional, Tuple
 import pickle
 from charm.toolbox.symcrypto import SymmetricCryptoAbstraction
-from charm.toolbox.pairinggroup import ZR
-import requests
+from charm.toolbox.pairinggroup import ZR, G1
 from models import PseudonymRequest
 from fastapi import HTTPException
-from hashes import hs, h
+from hashes import hs, h, keyword_digest
 
-from constants import GROUP, API_URL, MY_ID
-from db import DB
+from constants import GROUP, API_URL, MY_ID, HTTP_TIMEOUT, QUERY_CACHE_SIZE
+from cache import LRUCache
+from http_client import session
+from security_details import UserDetails
 from aliases import Document, Index
-from util import generate_random_string, generate_wildcard_list
+from util import generate_wildcard_list
+from indices import create_index, negotiate_index_format
 
+# serialized queries by the version of the security details and the keyed hash
+# of their keyword
+query_cache = LRUCache(QUERY_CACHE_SIZE)
+_queries_version: Optional[int] = None
 
-def gen_indizes(q_key: Any, keywords: List[str]) -> List[Index]:
-    """Generates indices used for searchable encryption.
-    Will send a request to the vault to compute a part for the encryption key
+
+def request_index_parts(blinded_groups: List[List[str]]) -> List[List[str]]:
+    """Lets the vault compute its part of the index keys for all keyword groups
+    with a single request. Vaults without batch support get one request per group
 
     Args:
-        q_key (Any): a query key necassry to encrypt the index
-        keyword (List[str]): a list of strings for which the indizes will be generated
+        blinded_groups (List[List[str]]): serialized blinded keywords of every group
+
+    Raises:
+        HTTPException: if the vault rejects a request
 
     Returns:
-        List[Index]: a list of indizes for the given keywords
+        List[List[str]]: the serialized answers of every group
     """
-    index_requests = []
-    key = DB.hget(f"users:{MY_ID}", "seed")
-    seed = key.encode()
-    random_blind = GROUP.random(ZR)
-    for keyword in keywords:
-        index_request = hs(GROUP, keyword, seed=seed) ** random_blind
-        index_requests.append(
-            GROUP.serialize(index_request, compression=False).decode()
-        )
-    response = requests.post(
-        f"{API_URL}/generateIndex",
-        json={"user_id": MY_ID, "hashed_keywords": index_requests},
-        timeout=10,
+    response = session.post(
+        f"{API_URL}/generateIndexBatch",
+        json={"user_id": MY_ID, "keyword_groups": blinded_groups},
+        timeout=HTTP_TIMEOUT,
     )
-    if response.ok:
-        index_answer = response.json()
-    else:
-        raise HTTPException(status_code=response.status_code, detail=response.json())
-    indizes = []
-    for index in index_answer:
-        k = h(
-            GROUP,
-            GROUP.deserialize(index.encode(), compression=False)
-            ** (q_key / random_blind),
+    if response.status_code != 404:
+        if not response.ok:
+            raise HTTPException(
+                status_code=response.status_code, detail=response.json()
+            )
+        return response.json()
+    index_answers = []
+    for blinded_keywords in blinded_groups:
+        response = session.post(
+            f"{API_URL}/generateIndex",
+            json={"user_id": MY_ID, "hashed_keywords": blinded_keywords},
+            timeout=HTTP_TIMEOUT,
         )
-        index_encrypter = SymmetricCryptoAbstraction(k)
-        res = generate_random_string(16)
-        e_index = index_encrypter.encrypt(res)
-        indizes.append((res, e_index))
-    return indizes
+        if not response.ok:
+            raise HTTPException(
+                status_code=response.status_code, detail=response.json()
+            )
+        index_answers.append(response.json())
+    return index_answers
+
+
+def gen_indizes_batch(
+    details: UserDetails,
+    keyword_groups: List[List[str]],
+    index_format: Optional[int] = None,
+) -> List[List[Index]]:
+    """Generates the indices of many keyword groups, e.g. of every wildcard list
+    of a record, with a single request to the vault. All keywords are blinded
+    with the same random and unblinded with the same exponent
+
+    Args:
+        details (UserDetails): security details with the query key and the seed
+        keyword_groups (List[List[str]]): keywords for which the indizes will be generated
+        index_format (Optional[int], optional): the index format to use.
+        Defaults to None, which uses the format negotiated with the vault.
+
+    Returns:
+        List[List[Index]]: the indizes of every keyword group
+    """
+    if index_format is None:
+        index_format = negotiate_index_format()
+    random_blind = GROUP.random(ZR)
+    blinded_groups = [
+        [
+            GROUP.serialize(
+                hs(GROUP, keyword, seed=details.seed) ** random_blind,
+                compression=False,
+            ).decode()
+            for keyword in keywords
+        ]
+        for keywords in keyword_groups
+    ]
+    unblind = details.query_key / random_blind
+    return [
+        [
+            create_index(
+                h(
+                    GROUP,
+                    GROUP.deserialize(index.encode(), compression=False) ** unblind,
+                ),
+                index_format,
+            )
+            for index in index_answer
+        ]
+        for index_answer in request_index_parts(blinded_groups)
+    ]
 
 
 def write(
-    document: PseudonymRequest, encryption_key: bytes, enable_fuzzy_search: bool
+    document: PseudonymRequest, details: UserDetails, enable_fuzzy_search: bool
 ) -> Document:
     """Generates a index and encrypts a document so that this tuple can be send to the vault
 
     Args:
         document (PseudonymRequest): a pseudonym request whoms data is written to the vault
-        encryption_key (bytes): a symmetric key to encrypt data
+        details (UserDetails): security details with the keys to encrypt data
         enable_fuzzy_search (bool): if fuzzy indizes should be created
 
     Returns:
         Document: a document containing the ciphertext and a matching index
     """
     keywords = list(document.data.values())
-    query_key = DB.hget(f"users:{MY_ID}", "queryKey")
-    i_w = []
-    if enable_fuzzy_search:
-        wildcard_lists = generate_wildcard_list(keywords)
-        for wildcard_list in wildcard_lists:
-            i_w.append(
-                gen_indizes(GROUP.deserialize(query_key.encode()), wildcard_list)
-            )
-    else:
-        i_w.append(gen_indizes(GROUP.deserialize(query_key.encode()), keywords))
+    # all wildcard lists of a fuzzy record are indexed with one request to the vault
+    keyword_groups = (
+        generate_wildcard_list(keywords) if enable_fuzzy_search else [keywords]
+    )
+    i_w = gen_indizes_batch(details, keyword_groups)
     encoded_dict = pickle.dumps(document.data)
-    record_encrypter = SymmetricCryptoAbstraction(encryption_key)
+    record_encrypter = SymmetricCryptoAbstraction(details.encryption_key)
     cipher_text = record_encrypter.encrypt(encoded_dict)
     return (cipher_text, i_w)
 
 
-def construct_query(q_key: Any, keywords: List[str]) -> Tuple[int, List[Any]]:
-    """Constructs a valid query that is used for searching in the vault
+def construct_serialized_query(
+    details: UserDetails, keywords: List[str]
+) -> Tuple[int, List[str]]:
+    """Constructs a valid query that is used for searching in the vault, serialized
+    for the vault. The queries of keywords that were searched before are taken from
+    a cache under the keyed hash of the keyword, so that they need no curve arithmetic
+    and no plaintext keyword is kept. The cache is cleared once the security details
+    change
 
     Args:
-        q_key (Any): query key for constructing the query
-        keyword (List[str]): keywords to search for
+        details (UserDetails): security details with the query key and the seed
+        keywords (List[str]): keywords to search for
 
     Returns:
-        Tuple[int, List[Any]]: a valid query containing the user id and a list of queries
+        Tuple[int, List[str]]: a valid query containing the user id and a list of
+        serialized queries
     """
-    queries = []
-    key = DB.hget(f"users:{MY_ID}", "seed")
-    seed = key.encode()
+    global _queries_version  # pylint: disable=global-statement
+    if _queries_version != details.version:
+        query_cache.clear()
+        _queries_version = details.version
+    serialized_queries = []
     for keyword in keywords:
-        query = hs(GROUP, keyword, seed=seed) ** q_key
-        queries.append(query)
-    return (MY_ID, queries)
+        digest = keyword_digest(keyword, details.seed)
+        # entries of former details can't be hit while the cache is being cleared
+        key = (details.version, digest)
+        query = query_cache.get(key)
+        if query is None:
+            query = GROUP.serialize(
+                GROUP.hash(digest, type=G1) ** details.query_key, compression=False
+            ).decode()
+            query_cache.put(key, query)
+        serialized_queries.append(query)
+    return (MY_ID, serialized_queries)
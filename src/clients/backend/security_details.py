@@ -0,0 +1,93 @@
+"""Security details of this client, received from the user-manager. They are kept in
+memory and only reloaded from redis when their version stamp changed, e.g. because
+another worker received new details"""
+from typing import Any, NamedTuple, Optional
+from fastapi import HTTPException
+from constants import GROUP, MY_ID
+from db import DB
+
+DETAILS_KEY = f"users:{MY_ID}"
+
+
+class UserDetails(NamedTuple):
+    """Deserialized security details of this client"""
+
+    version: int
+    query_key: Any
+    seed: bytes
+    encryption_key: bytes
+
+
+_details: Optional[UserDetails] = None
+
+
+def store_details(query_key: bytes, seed: str, encryption_key: bytes) -> int:
+    """Replaces the security details and increments their version in one transaction,
+    so that every worker reloads them on its next request
+
+    Args:
+        query_key (bytes): serialized query key
+        seed (str): the seed used for hashing keywords
+        encryption_key (bytes): symmetric key for records
+
+    Returns:
+        int: added fields
+    """
+    pipe = DB.pipeline(transaction=True)
+    pipe.hset(
+        DETAILS_KEY,
+        mapping={"queryKey": query_key, "seed": seed, "encryptionKey": encryption_key},
+    )
+    pipe.hincrby(DETAILS_KEY, "version", 1)
+    added_fields, _ = pipe.execute()
+    load_details()
+    return added_fields
+
+
+def load_details() -> Optional[UserDetails]:
+    """Loads and deserializes the security details with a single HGETALL
+
+    Returns:
+        Optional[UserDetails]: the details, None if this client is not enrolled yet
+    """
+    global _details  # pylint: disable=global-statement
+    fields = DB.hgetall(DETAILS_KEY)
+    if "encryptionKey" not in fields:
+        _details = None
+        return None
+    _details = UserDetails(
+        int(fields.get("version", 0)),
+        GROUP.deserialize(fields["queryKey"].encode(), compression=False),
+        fields["seed"].encode(),
+        fields["encryptionKey"].encode(),
+    )
+    return _details
+
+
+def get_details() -> Optional[UserDetails]:
+    """Returns the security details, only their version is read from redis
+    unless they changed
+
+    Returns:
+        Optional[UserDetails]: the details, None if this client is not enrolled yet
+    """
+    details = _details
+    version = DB.hget(DETAILS_KEY, "version")
+    if details is not None and details.version == int(version or 0):
+        return details
+    return load_details()
+
+
+def require_details() -> UserDetails:
+    """Returns the security details of an enrolled client
+
+    Raises:
+        HTTPException: if this client is not enrolled yet
+
+    Returns:
+        UserDetails: the details
+    """
+    details = get_details()
+    if details is None:
+        raise HTTPException(status_code=400, detail="User has not been enrolled yet")
+    return details
@@ -0,0 +1,91 @@
+"""Coalesces concurrent requests for the same record, so that only one of them searches
+and possibly adds the record while the others wait for its result. Requests are
+identified by a keyed hash of their keywords and options, the workers of
+the client backend are coordinated through a short-lived lock in redis"""
+import json
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List
+from redis.exceptions import LockError
+from constants import MY_ID, REQUEST_LOCK_TIMEOUT
+from db import DB
+from hashes import keyword_digest
+
+_in_flight: Dict[str, Future] = {}
+_lock = threading.Lock()
+
+
+def request_key(seed: bytes, keywords: List[str], *options: Any) -> str:
+    """Identifies a request by its keywords exactly as they are searched and added,
+    so that only requests with the same result are coalesced
+
+    Args:
+        seed (bytes): the seed of this client, the key of the hash
+        keywords (List[str]): keywords of the request
+        *options (Any): further json serializable parameters that change the result
+
+    Returns:
+        str: the keyed hash of the request
+    """
+    return keyword_digest(json.dumps([keywords, *options]), seed).hex()
+
+
+def _run_locked(key: str, function: Callable[[], Any]) -> Any:
+    """Runs a function while holding the redis lock of a request, so that workers
+    run the same request one after another. If the lock can't be acquired in time
+    the function runs regardless
+
+    Args:
+        key (str): the key of the request
+        function (Callable[[], Any]): the function to run
+
+    Returns:
+        Any: the result of the function
+    """
+    lock = DB.lock(
+        f"users:{MY_ID}:requests:{key}",
+        timeout=REQUEST_LOCK_TIMEOUT,
+        blocking_timeout=REQUEST_LOCK_TIMEOUT,
+    )
+    acquired = lock.acquire()
+    try:
+        return function()
+    finally:
+        if acquired:
+            try:
+                lock.release()
+            except LockError:
+                # expired while the function was running
+                pass
+
+
+def run_once(key: str, function: Callable[[], Any]) -> Any:
+    """Runs a function for a request unless the same request is already running,
+    in which case its result or exception is shared
+
+    Args:
+        key (str): the key of the request
+        function (Callable[[], Any]): computes the result of the request
+
+    Returns:
+        Any: the result of the request
+    """
+    with _lock:
+        future = _in_flight.get(key)
+        is_leader = future is None
+        if is_leader:
+            future = Future()
+            _in_flight[key] = future
+    if not is_leader:
+        return future.result()
+    try:
+        result = _run_locked(key, function)
+    except Exception as error:
+        future.set_exception(error)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        with _lock:
+            del _in_flight[key]
@@ -13,3 +13,6 @@ API_URL = os.environ.get("API_URL")
 USER_MANAGER_DB = os.environ.get("USER_MANAGER_DB")
 UA = "Authorized-Users-IDs"
 UR = "Revoked-User-IDs"
+# connections kept alive per service and timeouts of requests in seconds
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", 10))
+HTTP_TIMEOUT = float(os.environ.get("HTTP_TIMEOUT", 10))
@@ -0,0 +1,84 @@
+"""Shared HTTP clients of the user-manager. All calls to the vault and the clients go
+through one pooled session that keeps its connections alive, instead of opening a new
+connection for every request. Handlers that await their requests use the
+asynchronous client with the same limits"""
+from typing import Dict, Optional, Union
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from constants import HTTP_POOL_SIZE, HTTP_TIMEOUT
+
+
+def create_session(pool_size: int = HTTP_POOL_SIZE) -> requests.Session:
+    """Creates a session that keeps up to pool_size connections per host alive
+
+    Args:
+        pool_size (int, optional): connections kept per host. Defaults to HTTP_POOL_SIZE.
+
+    Returns:
+        requests.Session: the session
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+session = create_session()
+
+
+_async_client: Optional[httpx.AsyncClient] = None
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Returns the shared asynchronous client for handlers that await their requests,
+    created on first use so that it belongs to the running event loop
+
+    Returns:
+        httpx.AsyncClient: the client
+    """
+    global _async_client  # pylint: disable=global-statement
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=HTTP_POOL_SIZE,
+                max_keepalive_connections=HTTP_POOL_SIZE,
+            ),
+            timeout=HTTP_TIMEOUT,
+        )
+    return _async_client
+
+
+async def close_clients():
+    """Closes all pooled connections of the session and the asynchronous client"""
+    global _async_client  # pylint: disable=global-statement
+    session.close()
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+
+def statistics() -> Dict[str, Union[int, float]]:
+    """Returns how many requests of the session reused a kept alive connection
+
+    Returns:
+        Dict[str, Union[int, float]]: sent requests, opened connections, reused
+        connections and the share of requests that reused a connection
+    """
+    sent_requests = 0
+    opened_connections = 0
+    for adapter in set(session.adapters.values()):
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                sent_requests += pool.num_requests
+                opened_connections += pool.num_connections
+    reused_connections = max(sent_requests - opened_connections, 0)
+    return {
+        "requests": sent_requests,
+        "connections": opened_connections,
+        "reusedConnections": reused_connections,
+        "reuseRate": reused_connections / sent_requests if sent_requests else 0.0,
+    }
@@ -1,14 +1,16 @@
 """This module represents a user-manager that is responsible for rolling out and revoking users
 that want to request pseudonyms"""
-from typing import Any
+from typing import Any, Dict, Union
 import urllib.parse
 from charm.toolbox.pairinggroup import ZR, G1, G2, extract_key
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-import requests
 import redis
 from constants import USER_MANAGER_DB, API_URL, CLIENT_URL_LIST, GROUP, UA, UR
+from constants import HTTP_TIMEOUT
 from aliases import SetupParams
+from http_client import session, close_clients, get_async_client
+from http_client import statistics as connection_statistics
 
 app = FastAPI()
 origins = ["*"]
@@ -26,6 +28,12 @@ db = urllib.parse.urlsplit(USER_MANAGER_DB)
 redis = redis.Redis(host=db.hostname, port=db.port, db=0, decode_responses=True)
 
 
+@app.on_event("shutdown")
+async def close_connections():
+    """Closes the pooled connections to the vault and the clients"""
+    await close_clients()
+
+
 @app.post("/setup")
 def start_setup() -> str:
     """Starts the setup process and produces paramters to used to enroll future users
@@ -74,7 +82,7 @@ def enroll_user(user_id: int) -> bool:
         raise HTTPException(
             status_code=400, detail="User is not known to the user-manager"
         )
-    response = requests.put(
+    response = session.put(
         f"{client_url}/receiveSecurityDetails",
         json={
             "query_key": GROUP.serialize(user_detail, compression=False).decode(),
@@ -82,7 +90,7 @@ def enroll_user(user_id: int) -> bool:
             "encryption_key": f"{enc_key}",
             "user_id": user_id,
         },
-        timeout=10,
+        timeout=HTTP_TIMEOUT,
     )
     if response.ok:
         res = response.json()
@@ -90,8 +98,19 @@ def enroll_user(user_id: int) -> bool:
     raise HTTPException(status_code=response.status_code, detail=response.json())
 
 
+@app.get("/connectionStatistics")
+def get_connection_statistics() -> Dict[str, Union[int, float]]:
+    """Returns how many requests to the vault and the clients reused a kept alive
+    connection
+
+    Returns:
+        Dict[str, Union[int, float]]: statistics of the pooled connections
+    """
+    return connection_statistics()
+
+
 @app.post("/revoke")
-def revoke_user(user_id: int) -> bool:
+async def revoke_user(user_id: int) -> bool:
     """Revokes search rights for a user
 
     Args:
@@ -100,7 +119,7 @@ def revoke_user(user_id: int) -> bool:
     Returns:
         bool: if the revocation was successful
     """
-    return revoke(user_id)
+    return await revoke(user_id)
 
 
 def setup() -> SetupParams:
@@ -151,10 +170,10 @@ def enroll(user_id: int, group_element: Any) -> Any:
     g = GROUP.random(G1)
     com_k = g ** (group_element / xu)
     send_key: bytes = GROUP.serialize(com_k, compression=False)
-    successfull = requests.post(
+    successfull = session.post(
         f"{API_URL}/addUser",
         params={"user_id": user_id, "comp_key": send_key},
-        timeout=10,
+        timeout=HTTP_TIMEOUT,
     ).json()
     if successfull:
         rows = redis.sadd(UA, user_id)
@@ -165,7 +184,7 @@ def enroll(user_id: int, group_element: Any) -> Any:
     return xu
 
 
-def revoke(user_id: int) -> bool:
+async def revoke(user_id: int) -> bool:
     """Revokes a user with a given id from the system.
     Sends a request to the vault to delete the user entry there. If this fails for some
     reason a user will still have access rights even if he is marked here as a revoked user
@@ -180,9 +199,10 @@ def revoke(user_id: int) -> bool:
     redis.srem(UA, user_id)
     redis.sadd(UR, user_id)
 
-    response = requests.post(
-        f"{API_URL}/revoke", params={"user_id": user_id}, timeout=10
+    # awaited, so that revoking doesn't occupy a worker thread while the vault answers
+    response = await get_async_client().post(
+        f"{API_URL}/revoke", params={"user_id": user_id}
     )
-    if response.ok:
+    if response.is_success:
         return response.json()
     raise HTTPException(status_code=response.status_code, detail=response.json())
@@ -1,4 +1,10 @@
 """Type aliases"""
-from typing import Tuple
+from typing import List, Optional, Tuple
 
 Index = Tuple[str, str]
+# index format, nonce and format specific payload
+ParsedIndex = Tuple[int, bytes, bytes]
+IndexGroups = Tuple[Tuple[ParsedIndex, ...], ...]
+# decryption keys, if the search is fuzzy, the amount of keywords that need to match,
+# the maximum amount of matches (None for all matches) and the searching user
+Search = Tuple[List[List[bytes]], bool, int, Optional[int], int]
@@ -1,17 +1,62 @@
 """Api for storing, writing and searching searchable encrypted data"""
-from typing import Dict, List, Tuple, Union
+from itertools import chain, islice
+from typing import Dict, List, Optional, Tuple, Union
+import json
 from fastapi import FastAPI, HTTPException
-from constants import PSEUDONYM_ENTRIES, GROUP
-from db import database
-from se import revoke_access, search, fuzzy_search
-from pseudonyms import generate_pseudonym
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from constants import INDEX_FORMATS
+from db import storage
+from se import revoke_access, search, fuzzy_search, build_search
+from se import lookup_records, stream_search_records
+from se import search_records as search_all
+from keys import get_complementary_key, register_user, register_users
+from keys import statistics as key_cache_statistics
+from results import statistics as result_cache_statistics
+from snapshot import snapshot
+from parallel import start_workers, stop_workers, restart_workers, pair_all_parallel
+from indices import parse_indices
+from pseudonyms import PseudonymAllocator
+from metrics import expose, timed
 from models import (
     AddRequest,
+    BatchAddRequest,
     SearchRequest,
+    BatchSearchRequest,
     IndexRequest,
+    BatchIndexRequest,
+    RecordLookupRequest,
 )
 
 app = FastAPI()
+pseudonyms = PseudonymAllocator(storage.find_record_ids)
+
+
+@app.on_event("startup")
+def load_snapshot():
+    """Loads the index snapshot and the complementary keys of all users once when the
+    vault starts, fills the pseudonym pool and starts the search workers afterwards,
+    so that they can share the snapshot"""
+    snapshot.rebuild()
+    register_users()
+    pseudonyms.refill()
+    start_workers()
+
+
+@app.on_event("shutdown")
+def shutdown_workers():
+    """Stops the search workers"""
+    stop_workers()
+
+
+@app.get("/indexFormats")
+def index_formats() -> List[int]:
+    """Returns the index formats this vault can search, clients use the newest
+    format they support as well
+
+    Returns:
+        List[int]: supported index formats
+    """
+    return INDEX_FORMATS
 
 
 @app.post("/generateIndex")
@@ -27,73 +72,251 @@ def gen_index(index_request: IndexRequest) -> List[bytes]:
     Returns:
         List[bytes]: a list of hashed keywords
     """
-    com_key = database.get(index_request.user_id)
-    if com_key is None:
+    com_k = get_complementary_key(index_request.user_id)
+    if com_k is None:
         raise HTTPException(
             status_code=403, detail="User is not authorized to generate index"
         )
 
-    hashed_keywords = [
-        GROUP.serialize(
-            GROUP.pair_prod(
-                GROUP.deserialize(keyword.encode(), compression=False),
-                GROUP.deserialize(com_key.encode(), compression=False),
-            ),
-            compression=False,
+    with timed("gen_index", "pairing"):
+        return pair_all_parallel(com_k, index_request.hashed_keywords)
+
+
+@app.post("/generateIndexBatch")
+def gen_index_batch(index_request: BatchIndexRequest) -> List[List[bytes]]:
+    """Computes the index parts for all keyword groups of a record in one request,
+    on the worker processes if they are enabled
+
+    Args:
+        index_request (BatchIndexRequest): hashed keywords grouped e.g. by wildcard list
+
+    Raises:
+        HTTPException: if no complementary key is found
+
+    Returns:
+        List[List[bytes]]: the hashed keywords of every group
+    """
+    com_k = get_complementary_key(index_request.user_id)
+    if com_k is None:
+        raise HTTPException(
+            status_code=403, detail="User is not authorized to generate index"
+        )
+    groups = index_request.keyword_groups
+    with timed("gen_index", "pairing"):
+        paired_keywords = iter(
+            pair_all_parallel(com_k, list(chain.from_iterable(groups)))
         )
-        for keyword in index_request.hashed_keywords
-    ]
-    return hashed_keywords
+    return [list(islice(paired_keywords, len(group))) for group in groups]
+
+
+def store_records(requests: List[AddRequest]) -> List[Tuple[str, str]]:
+    """Stores new records. An id range and pseudonyms for all records are reserved
+    at once and all records are handed to the storage together
+
+    Args:
+        requests (List[AddRequest]): requests for adding new documents
+
+    Returns:
+        List[Tuple[str, str]]: the generated pseudonym and the corresponding record
+        for every request
+    """
+    if not requests:
+        return []
+    with timed("add_record", "reserve"):
+        last_id = storage.reserve_ids(len(requests))
+    first_id = last_id - len(requests) + 1
+    with timed("add_record", "pseudonyms"):
+        new_pseudonyms = pseudonyms.take(len(requests))
+    with timed("add_record", "parse"):
+        added_records = [
+            (record_id, pseudonym, request.record, parse_indices(request.indices))
+            for record_id, pseudonym, request in zip(
+                range(first_id, last_id + 1), new_pseudonyms, requests
+            )
+        ]
+    with timed("add_record", "write"):
+        try:
+            storage.write_records(added_records)
+        finally:
+            pseudonyms.release(new_pseudonyms)
+    with timed("add_record", "snapshot"):
+        for record_id, _, _, grouped_indices in added_records:
+            snapshot.add(record_id, grouped_indices)
+    return [(pseudonym, record) for _, pseudonym, record, _ in added_records]
 
 
 @app.post("/addRecord")
-def add_record(request: AddRequest) -> Tuple[str, Dict]:
+def add_record(request: AddRequest) -> Tuple[str, str]:
     """Adds a new record to the database
 
     Args:
         request (AddRequest): a request for adding a new document
 
     Returns:
-        Tuple[str, Dict]: a tuple containing the generated pseudonym and the corresponding record
+        Tuple[str, str]: a tuple containing the generated pseudonym and the corresponding record
     """
-    pseudonym = generate_pseudonym(request.record)
-    database.incr("hash_name_index", 1)
-    hash_index = database.get("hash_name_index")
+    return store_records([request])[0]
 
-    for keyword_number, index_list in enumerate(request.indices):
-        for index_number, index in enumerate(index_list):
-            combined_index = ",".join(index)
-            database.hset(
-                f"{PSEUDONYM_ENTRIES}:{hash_index}",
-                f"index:{keyword_number}: {index_number}",
-                combined_index,
-            )
 
-    database.hset(f"{PSEUDONYM_ENTRIES}:{hash_index}", "pseudonym", pseudonym)
-    database.hset(f"{PSEUDONYM_ENTRIES}:{hash_index}", "record", request.record)
-    return (pseudonym, request.record)
+@app.post("/addRecords")
+def add_records(request: BatchAddRequest) -> List[Tuple[str, str]]:
+    """Adds many new records to the database at once
+
+    Args:
+        request (BatchAddRequest): a request containing multiple documents
+
+    Returns:
+        List[Tuple[str, str]]: the generated pseudonym and the corresponding record
+        for every document
+    """
+    return store_records(request.records)
 
 
 @app.post("/search")
-def search_records(request: SearchRequest) -> List:
+def search_records(request: SearchRequest) -> Response:
     """Searches for records that match the given search words
 
     Args:
         request (SearchRequest): a request to search for data
 
     Returns:
-        List: a list of matching records
+        Response: json encoded list of matching records
     """
-
-    search_queries = [
-        [GROUP.deserialize(query.encode(), compression=False) for query in queries]
-        for queries in request.queries
-    ]
     if request.is_fuzzy:
-        return fuzzy_search(
-            request.user_id, search_queries, request.expected_amount_of_keywords
+        operation = "fuzzy_search"
+        matches = fuzzy_search(
+            request.user_id,
+            request.queries,
+            request.expected_amount_of_keywords,
+            request.min_matching_keywords,
+            request.limit,
         )
-    return search(request.user_id, search_queries)
+    else:
+        operation = "search"
+        matches = search(request.user_id, request.queries, request.limit)
+    with timed(operation, "encode"):
+        content = json.dumps(matches)
+    return Response(content, media_type="application/json")
+
+
+@app.post("/searchStream")
+def stream_search(request: SearchRequest) -> StreamingResponse:
+    """Searches for records that match the given search words and streams every
+    match as soon as it is found, one json encoded [record, pseudonym] per line
+
+    Args:
+        request (SearchRequest): a request to search for data
+
+    Returns:
+        StreamingResponse: newline delimited json of all matching records
+    """
+    search_request = build_search(
+        request.user_id,
+        request.queries,
+        request.is_fuzzy,
+        request.expected_amount_of_keywords,
+        request.min_matching_keywords,
+        request.limit,
+    )
+    return StreamingResponse(
+        (json.dumps(match) + "\n" for match in stream_search_records(search_request)),
+        media_type="application/x-ndjson",
+    )
+
+
+@app.post("/searchBatch")
+def search_records_batch(request: BatchSearchRequest) -> List[Optional[List]]:
+    """Answers many independent search requests, possibly from different users,
+    with a single pass over all records
+
+    Args:
+        request (BatchSearchRequest): a request containing multiple search requests
+
+    Returns:
+        List[Optional[List]]: a list of matching records for every search request,
+        None for search requests of users that are not authorized to search
+    """
+    searches = []
+    for search_request in request.requests:
+        try:
+            searches.append(
+                build_search(
+                    search_request.user_id,
+                    search_request.queries,
+                    search_request.is_fuzzy,
+                    search_request.expected_amount_of_keywords,
+                    search_request.min_matching_keywords,
+                    search_request.limit,
+                )
+            )
+        except HTTPException:
+            # a revoked or unknown user only fails its own search, not the batch
+            searches.append(None)
+    authorized = [search for search in searches if search is not None]
+    matches = iter(search_all(authorized) if authorized else [])
+    return [None if search is None else next(matches) for search in searches]
+
+
+def authorize_lookup(user_id: int):
+    """Checks that a user may re-identify records by their pseudonym.
+    Only checks that the user id has a registered complementary key. It doesn't prove
+    that the caller holds the query key of that user, and user ids are easy to guess.
+    A token the vault could check against the complementary key would need
+    verification material that also lets the vault compute the indices of any
+    keyword itself. So the lookups rely on the vault being reachable only by the
+    client backends, like /addUser and /revoke
+
+    Args:
+        user_id (int): a user identifier
+
+    Raises:
+        HTTPException: if no complementary key is found
+    """
+    if get_complementary_key(user_id) is None:
+        raise HTTPException(
+            status_code=403, detail="User is not authorized to look up records"
+        )
+
+
+@app.get("/record/{pseudonym}")
+def get_record(pseudonym: str, user_id: int) -> str:
+    """Returns the encrypted record of a pseudonym with a single index lookup.
+    The caller is trusted to act for the given user, see authorize_lookup
+
+    Args:
+        pseudonym (str): the pseudonym of a record
+        user_id (int): a user identifier
+
+    Raises:
+        HTTPException: if the user is not authorized or the pseudonym is unknown
+
+    Returns:
+        str: the encrypted record
+    """
+    authorize_lookup(user_id)
+    record = lookup_records([pseudonym])[0]
+    if record is None:
+        raise HTTPException(status_code=404, detail="Pseudonym couldn't be found")
+    return record
+
+
+@app.post("/records")
+def get_records(request: RecordLookupRequest) -> List[Optional[str]]:
+    """Returns the encrypted records of many pseudonyms at once.
+    The caller is trusted to act for the given user, see authorize_lookup
+
+    Args:
+        request (RecordLookupRequest): a request containing the pseudonyms
+
+    Raises:
+        HTTPException: if the user is not authorized
+
+    Returns:
+        List[Optional[str]]: the encrypted record for every pseudonym,
+        None for unknown pseudonyms
+    """
+    authorize_lookup(request.user_id)
+    return lookup_records(request.pseudonyms)
 
 
 @app.post("/revoke")
@@ -120,4 +343,50 @@ def add_user(user_id: int, comp_key: bytes) -> Union[bool, None]:
     Returns:
         Union[bool, None]: if adding the user was successful
     """
-    return database.set(user_id, comp_key)
+    added = storage.set_user_key(user_id, comp_key)
+    if added:
+        register_user(user_id, comp_key)
+    return added
+
+
+@app.post("/rebuildSnapshot")
+def rebuild_snapshot() -> int:
+    """Reloads the index snapshot from the database
+
+    Returns:
+        int: the amount of records in the snapshot
+    """
+    records = snapshot.rebuild()
+    restart_workers()
+    return records
+
+
+@app.get("/metrics")
+def metrics() -> PlainTextResponse:
+    """Returns the stage durations and counters of the vault in the Prometheus
+    text format, all values stay zero unless METRICS_ENABLED is set
+
+    Returns:
+        PlainTextResponse: the metrics
+    """
+    return PlainTextResponse(expose(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/snapshotStatistics")
+def snapshot_statistics() -> Dict[str, int]:
+    """Returns size and hit/miss counters of the index snapshot
+
+    Returns:
+        Dict[str, int]: statistics of the index snapshot
+    """
+    return snapshot.statistics()
+
+
+@app.get("/cacheStatistics")
+def cache_statistics() -> Dict[str, Dict[str, Union[int, float]]]:
+    """Returns size and hit/miss counters of the key caches and the search result cache
+
+    Returns:
+        Dict[str, Dict[str, Union[int, float]]]: statistics for every cache
+    """
+    return {**key_cache_statistics(), "searchResults": result_cache_statistics()}
@@ -6,5 +6,23 @@ from charm.toolbox.pairinggroup import PairingGroup
 load_dotenv()
 
 API_DB = os.environ.get("API_DB")
+# redis or local, the embedded storage in STORAGE_PATH
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "redis")
+STORAGE_PATH = os.environ.get("STORAGE_PATH", "vault-data")
+LOCAL_SEGMENT_SIZE = int(os.environ.get("LOCAL_SEGMENT_SIZE", 64 * 2**20))
 PSEUDONYM_ENTRIES = os.environ.get("PSEUDONYM_ENTRIES")
 GROUP = PairingGroup(os.environ.get("PAIRING_GROUP"))
+SEARCH_BATCH_SIZE = int(os.environ.get("SEARCH_BATCH_SIZE", 500))
+SNAPSHOT_MAX_RECORDS = int(os.environ.get("SNAPSHOT_MAX_RECORDS", 0))
+SEARCH_WORKERS = int(os.environ.get("SEARCH_WORKERS", 0))
+LEGACY_INDEX_FORMAT = 1
+TAG_INDEX_FORMAT = 2
+INDEX_FORMATS = [LEGACY_INDEX_FORMAT, TAG_INDEX_FORMAT]
+COMPLEMENTARY_KEY_CACHE_SIZE = int(os.environ.get("COMPLEMENTARY_KEY_CACHE_SIZE", 1024))
+SEARCH_KEY_CACHE_SIZE = int(os.environ.get("SEARCH_KEY_CACHE_SIZE", 100000))
+SEARCH_RESULT_CACHE_SIZE = int(os.environ.get("SEARCH_RESULT_CACHE_SIZE", 10000))
+SEARCH_RESULT_CACHE_BYTES = int(
+    os.environ.get("SEARCH_RESULT_CACHE_BYTES", 64 * 2**20)
+)
+PSEUDONYM_POOL_SIZE = int(os.environ.get("PSEUDONYM_POOL_SIZE", 10000))
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "false").lower() in ("1", "true")
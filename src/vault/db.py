@@ -1,7 +1,25 @@
-"""Connection to the database"""
+"""Storage of the vault, redis unless STORAGE_BACKEND is local"""
 import urllib.parse
 import redis
-from constants import API_DB
+from constants import API_DB, STORAGE_BACKEND, STORAGE_PATH
+from storage import Storage
+from redis_storage import RedisStorage
+from local_storage import LocalStorage
 
-db = urllib.parse.urlsplit(API_DB)
-database = redis.Redis(host=db.hostname, port=db.port, db=0, decode_responses=True)
+
+def create_storage() -> Storage:
+    """Creates the configured storage
+
+    Returns:
+        Storage: the embedded local storage or a storage on the redis server at API_DB
+    """
+    if STORAGE_BACKEND == "local":
+        return LocalStorage(STORAGE_PATH)
+    db = urllib.parse.urlsplit(API_DB)
+    return RedisStorage(
+        redis.Redis(host=db.hostname, port=db.port, db=0, decode_responses=True),
+        redis.Redis(host=db.hostname, port=db.port, db=0),
+    )
+
+
+storage = create_storage()
@@ -1,6 +1,6 @@
 """This module provides hash functions that convert
 from or to a group Element to hashed value or new group element"""
-from hashlib import sha256
+from hashlib import blake2b, sha256
 from typing import Any
 from charm.toolbox.pairinggroup import PairingGroup
 
@@ -19,3 +19,16 @@ def h(group: PairingGroup, group_element: Any) -> bytes:
         bytes: a hashed group element
     """
     return sha256(group.serialize(group_element, compression=False)).digest()
+
+
+def index_tag(key: bytes, nonce: bytes) -> bytes:
+    """Keyed hash used as verification tag of an index entry.
+
+    Args:
+        key (bytes): a hashed group element, see h
+        nonce (bytes): the random nonce of the index entry
+
+    Returns:
+        bytes: a 16 byte tag
+    """
+    return blake2b(nonce, key=key, digest_size=16).digest()
@@ -0,0 +1,203 @@
+"""Parsing, storage encoding and matching of index entries.
+
+Two index formats are supported:
+ - LEGACY_INDEX_FORMAT: 'random,encrypted random' where the random is a 16 character string
+   and the encrypted random is the json output of SymmetricCryptoAbstraction.encrypt
+ - TAG_INDEX_FORMAT: 'v2:base64(nonce),base64(tag)' where the tag is a keyed hash
+   of the nonce, see hashes.index_tag
+
+The vault stores all parsed index entries of a record packed into a single value:
+version byte, amount of keyword groups, and for every group the amount of entries
+followed by the entries. Every entry is its index format, nonce length and
+payload length followed by the raw nonce and payload bytes. Nonces are created
+by the clients and not validated by the vault, so their length is stored with
+every entry instead of assuming a fixed width, which costs a single byte
+"""
+import hmac
+import json
+import struct
+from base64 import b64decode
+from typing import Dict, List, Optional
+from charm.toolbox.symcrypto import SymmetricCryptoAbstraction
+from constants import LEGACY_INDEX_FORMAT, TAG_INDEX_FORMAT
+from aliases import IndexGroups, ParsedIndex
+from hashes import index_tag
+
+TAG_INDEX_PREFIX = f"v{TAG_INDEX_FORMAT}:"
+IV_LENGTH = 16
+PACKED_INDICES_VERSION = 1
+PACKED_COUNT = struct.Struct("<H")
+# index format, nonce length and payload length
+PACKED_ENTRY_HEADER = struct.Struct("<BBH")
+
+
+class SearchToken:
+    """A decryption key of a search together with the cipher built from it"""
+
+    __slots__ = ("key", "aes")
+
+    def __init__(self, key: bytes):
+        """
+        Args:
+            key (bytes): a decryption key of a search
+        """
+        self.key = key
+        self.aes = SymmetricCryptoAbstraction(key)
+
+
+def parse_index(index: str) -> Optional[ParsedIndex]:
+    """Parses a stored index entry once, so that searching doesn't need to split,
+    json decode and base64 decode it again
+
+    Args:
+        index (str): a stored index entry
+
+    Returns:
+        Optional[ParsedIndex]: a tuple of the index format, the nonce and the payload.
+        The payload is the iv followed by the ciphertext for legacy entries and
+        the tag for tag entries. None if the entry is malformed
+    """
+    e_index = index.split(sep=",", maxsplit=1)
+    if len(e_index) != 2:
+        print("The key was not a expected index", e_index)
+        print("length was", len(e_index))
+        return None
+    if e_index[0].startswith(TAG_INDEX_PREFIX):
+        return (
+            TAG_INDEX_FORMAT,
+            b64decode(e_index[0][len(TAG_INDEX_PREFIX) :]),
+            b64decode(e_index[1]),
+        )
+    cipher_text = json.loads(e_index[1])
+    return (
+        LEGACY_INDEX_FORMAT,
+        e_index[0].encode(),
+        b64decode(cipher_text["IV"]) + b64decode(cipher_text["CipherText"]),
+    )
+
+
+def group_indices(record: Dict[str, str]) -> IndexGroups:
+    """Parses the index fields of a record and groups them by their keyword number.
+    Index fields are stored as 'index:{keyword_number}: {index_number}'
+
+    Args:
+        record (Dict[str, str]): all fields of a record
+
+    Returns:
+        IndexGroups: parsed index entries for every keyword number
+    """
+    grouped_indices: Dict[int, List[ParsedIndex]] = {}
+    for field, index in record.items():
+        if field.startswith("index:"):
+            parsed_index = parse_index(index)
+            if parsed_index is not None:
+                keyword_number = int(field.split(":")[1])
+                grouped_indices.setdefault(keyword_number, []).append(parsed_index)
+    return tuple(
+        tuple(grouped_indices.get(keyword_number, ()))
+        for keyword_number in range(max(grouped_indices, default=-1) + 1)
+    )
+
+
+def parse_indices(indices: List[List]) -> IndexGroups:
+    """Parses the indices of an incoming AddRequest
+
+    Args:
+        indices (List[List]): a list of index entries for every keyword number
+
+    Returns:
+        IndexGroups: parsed index entries for every keyword number
+    """
+    return tuple(
+        tuple(
+            parsed_index
+            for parsed_index in (parse_index(",".join(index)) for index in index_list)
+            if parsed_index is not None
+        )
+        for index_list in indices
+    )
+
+
+def pack_indices(grouped_indices: IndexGroups) -> bytes:
+    """Encodes parsed index entries into the packed storage layout
+
+    Args:
+        grouped_indices (IndexGroups): parsed index entries for every keyword number
+
+    Returns:
+        bytes: the packed index entries of a record
+    """
+    parts = [bytes((PACKED_INDICES_VERSION,)), PACKED_COUNT.pack(len(grouped_indices))]
+    for indices in grouped_indices:
+        parts.append(PACKED_COUNT.pack(len(indices)))
+        for index_format, nonce, payload in indices:
+            parts.append(
+                PACKED_ENTRY_HEADER.pack(index_format, len(nonce), len(payload))
+            )
+            parts.append(nonce)
+            parts.append(payload)
+    return b"".join(parts)
+
+
+def unpack_indices(packed_indices: bytes) -> IndexGroups:
+    """Decodes index entries of the packed storage layout,
+    no splitting, json decoding or base64 decoding is needed
+
+    Args:
+        packed_indices (bytes): the packed index entries of a record
+
+    Raises:
+        ValueError: if the layout version is unknown
+
+    Returns:
+        IndexGroups: parsed index entries for every keyword number
+    """
+    if packed_indices[0] != PACKED_INDICES_VERSION:
+        raise ValueError(f"Unknown packed index version {packed_indices[0]}")
+    (group_count,) = PACKED_COUNT.unpack_from(packed_indices, 1)
+    position = 1 + PACKED_COUNT.size
+    grouped_indices = []
+    for _ in range(group_count):
+        (entry_count,) = PACKED_COUNT.unpack_from(packed_indices, position)
+        position += PACKED_COUNT.size
+        indices = []
+        for _ in range(entry_count):
+            (
+                index_format,
+                nonce_length,
+                payload_length,
+            ) = PACKED_ENTRY_HEADER.unpack_from(packed_indices, position)
+            nonce_start = position + PACKED_ENTRY_HEADER.size
+            payload_start = nonce_start + nonce_length
+            position = payload_start + payload_length
+            indices.append(
+                (
+                    index_format,
+                    packed_indices[nonce_start:payload_start],
+                    packed_indices[payload_start:position],
+                )
+            )
+        grouped_indices.append(tuple(indices))
+    return tuple(grouped_indices)
+
+
+def is_match(token: SearchToken, index: ParsedIndex) -> bool:
+    """Checks if a parsed index entry matches the given search token.
+    Tag entries are verified with a single keyed hash, legacy entries
+    need to be decrypted
+
+    Args:
+        token (SearchToken): a search token
+        index (ParsedIndex): a parsed index entry
+
+    Returns:
+        bool: true if the index entry was created for the searched keyword
+    """
+    index_format, nonce, payload = index
+    if index_format == TAG_INDEX_FORMAT:
+        return hmac.compare_digest(index_tag(token.key, nonce), payload)
+    # _decrypt skips the json and base64 decoding that decrypt would redo per entry
+    inn: bytes = token.aes._decrypt(  # pylint: disable=protected-access
+        {"IV": payload[:IV_LENGTH], "CipherText": payload[IV_LENGTH:]}
+    )
+    return nonce == inn
@@ -0,0 +1,197 @@
+"""Caches for the deserialized complementary keys of the users and for the
+decryption keys derived from them, so that repeated searches skip the pairing"""
+import threading
+from itertools import islice
+from typing import Any, Dict, Hashable, List, Optional, Union
+from fastapi import HTTPException
+from constants import COMPLEMENTARY_KEY_CACHE_SIZE, GROUP, SEARCH_KEY_CACHE_SIZE
+from db import storage
+from hashes import h
+from cache import LRUCache
+
+
+class ComplementaryKey:
+    """Deserialized complementary key of a user, together with its serialized form
+    that is handed to the worker processes"""
+
+    __slots__ = ("user_id", "serialized_com_k", "com_k")
+
+    def __init__(self, user_id: int, com_k: Union[str, bytes]):
+        """
+        Args:
+            user_id (int): user identifier
+            com_k (Union[str, bytes]): serialized complementary key of the user
+        """
+        if isinstance(com_k, str):
+            com_k = com_k.encode()
+        self.user_id = user_id
+        self.serialized_com_k = com_k
+        self.com_k = GROUP.deserialize(com_k, compression=False)
+
+    def pair(self, element: Any) -> Any:
+        """Computes e(element, com_k)
+
+        Args:
+            element (Any): a group element
+
+        Returns:
+            Any: the pairing result
+        """
+        return GROUP.pair_prod(element, self.com_k)
+
+    def pair_serialized(self, element: str) -> Any:
+        """Computes e(element, com_k) for a serialized group element
+
+        Args:
+            element (str): a serialized group element
+
+        Returns:
+            Any: the pairing result
+        """
+        return self.pair(GROUP.deserialize(element.encode(), compression=False))
+
+    def pair_all_serialized(self, elements: List[str]) -> List[bytes]:
+        """Computes e(element, com_k) for serialized group elements
+
+        Args:
+            elements (List[str]): serialized group elements
+
+        Returns:
+            List[bytes]: the serialized pairing results
+        """
+        return [
+            GROUP.serialize(self.pair_serialized(element), compression=False)
+            for element in elements
+        ]
+
+
+complementary_keys = LRUCache(COMPLEMENTARY_KEY_CACHE_SIZE)
+search_keys = LRUCache(SEARCH_KEY_CACHE_SIZE)
+# incremented whenever the keys of a user are invalidated, keys that were looked up
+# before an invalidation are not cached, so a revoked user can't be cached again
+_user_generations: Dict[int, int] = {}
+_invalidation_lock = threading.Lock()
+
+
+def _put_unless_invalidated(
+    cache: LRUCache, user_id: int, generation: int, key: Hashable, value: Any
+):
+    """Caches a value of a user unless the keys of the user were invalidated
+    since the value was looked up
+
+    Args:
+        cache (LRUCache): the cache
+        user_id (int): user identifier
+        generation (int): generation of the user when the lookup started
+        key (Hashable): key of the value
+        value (Any): the value
+    """
+    with _invalidation_lock:
+        if _user_generations.get(user_id, 0) == generation:
+            cache.put(key, value)
+
+
+def register_user(user_id: int, com_k: Union[str, bytes]):
+    """Deserializes the complementary key of a newly added user, so that even the
+    first request of the user doesn't need to prepare it
+
+    Args:
+        user_id (int): user identifier
+        com_k (Union[str, bytes]): serialized complementary key of the user
+    """
+    invalidate_user(user_id)
+    complementary_keys.put(user_id, ComplementaryKey(user_id, com_k))
+
+
+def register_users() -> int:
+    """Deserializes the complementary keys of all users stored in the database,
+    used when the vault starts
+
+    Returns:
+        int: the amount of prepared users
+    """
+    users = 0
+    for user_id, com_k in islice(storage.user_keys(), complementary_keys.max_size):
+        complementary_keys.put(user_id, ComplementaryKey(user_id, com_k))
+        users += 1
+    return users
+
+
+def get_complementary_key(user_id: int) -> Optional[ComplementaryKey]:
+    """Returns the deserialized complementary key of a user
+
+    Args:
+        user_id (int): user identifier
+
+    Returns:
+        Optional[ComplementaryKey]: the complementary key, None if the user is not
+        authorized
+    """
+    com_k = complementary_keys.get(user_id)
+    if com_k is None:
+        generation = _user_generations.get(user_id, 0)
+        serialized_com_k = storage.get_user_key(user_id)
+        if serialized_com_k is None:
+            return None
+        com_k = ComplementaryKey(user_id, serialized_com_k)
+        _put_unless_invalidated(complementary_keys, user_id, generation, user_id, com_k)
+    return com_k
+
+
+def get_search_keys(user_id: int, queries: List[List[str]]) -> List[List[bytes]]:
+    """Derives the decryption keys h(e(query, com_k)) for serialized queries of a user
+
+    Args:
+        user_id (int): user identifier
+        queries (List[List[str]]): serialized queries
+
+    Raises:
+        HTTPException: if the user is not authorized to search
+
+    Returns:
+        List[List[bytes]]: a decryption key for every query
+    """
+    generation = _user_generations.get(user_id, 0)
+    # authorized on every request, the cached key is dropped once access is revoked
+    com_k = get_complementary_key(user_id)
+    if com_k is None:
+        raise HTTPException(status_code=403, detail="User is not authorized to search")
+    keys = []
+    for query_list in queries:
+        query_keys = []
+        for query in query_list:
+            key = search_keys.get((user_id, query))
+            if key is None:
+                key = h(GROUP, com_k.pair_serialized(query))
+                _put_unless_invalidated(
+                    search_keys, user_id, generation, (user_id, query), key
+                )
+            query_keys.append(key)
+        keys.append(query_keys)
+    return keys
+
+
+def invalidate_user(user_id: int):
+    """Removes all cached keys of a user, needs to be called whenever
+    the complementary key of the user changes. Lookups that are still running
+    won't cache their keys afterwards
+
+    Args:
+        user_id (int): user identifier
+    """
+    with _invalidation_lock:
+        _user_generations[user_id] = _user_generations.get(user_id, 0) + 1
+        complementary_keys.invalidate(lambda key: key == user_id)
+        search_keys.invalidate(lambda key: key[0] == user_id)
+
+
+def statistics() -> Dict[str, Dict[str, Union[int, float]]]:
+    """Returns statistics about the key caches
+
+    Returns:
+        Dict[str, Dict[str, Union[int, float]]]: statistics for every cache
+    """
+    return {
+        "complementaryKeys": complementary_keys.statistics(),
+        "searchKeys": search_keys.statistics(),
+    }
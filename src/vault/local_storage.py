@@ -0,0 +1,404 @@
+"""Embedded single-node storage of the vault, runs without a redis server.
+
+All data lives in append-only files inside STORAGE_PATH:
+ - records.log: pseudonyms and encrypted records
+ - index-{n}.seg: index segments with the packed index entries of every record, they
+   are read through memory maps, so loading indices reads straight from the page cache
+ - users.log: complementary keys of users, an empty key marks a deletion
+ - record-ids: the largest reserved record id
+A record becomes visible once its index entry is written. Writers are serialized
+with a file lock, other processes pick up new entries on their next read"""
+import fcntl
+import mmap
+import os
+import struct
+import threading
+from bisect import bisect_left, bisect_right, insort
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+from constants import LOCAL_SEGMENT_SIZE, SEARCH_BATCH_SIZE
+from aliases import IndexGroups
+from indices import pack_indices, unpack_indices
+from storage import Storage, StoredRecord
+
+# every header starts with an id followed by the lengths of the payload parts
+RECORD_HEADER = struct.Struct("<QII")  # record id, pseudonym length, record length
+INDEX_HEADER = struct.Struct("<QI")  # record id, index length
+USER_HEADER = struct.Struct("<qI")  # user id, key length
+RECORD_ID_COUNTER = struct.Struct("<Q")
+
+
+class _Log:
+    """Append-only file of entries with a fixed size header, read through a memory map"""
+
+    def __init__(self, path: str, header: struct.Struct):
+        """
+        Args:
+            path (str): path of the file, created if it doesn't exist
+            header (struct.Struct): header of every entry
+        """
+        self.header = header
+        # end of the last complete entry that was read
+        self.position = 0
+        self._file = open(path, "a+b")  # pylint: disable=consider-using-with
+        self._map: Optional[mmap.mmap] = None
+        self._mapped_size = 0
+
+    def _view(self) -> Optional[mmap.mmap]:
+        """Returns a memory map of the whole file, remapped whenever the file grew"""
+        size = os.fstat(self._file.fileno()).st_size
+        if size != self._mapped_size:
+            # a previous map is closed once no reader uses it anymore
+            self._map = (
+                mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ)
+                if size
+                else None
+            )
+            self._mapped_size = size
+        return self._map
+
+    def read(self, offset: int, length: int) -> bytes:
+        """Reads a payload
+
+        Args:
+            offset (int): position of the payload in the file
+            length (int): length of the payload
+
+        Returns:
+            bytes: the payload
+        """
+        view = self._view()
+        if offset + length > self._mapped_size:
+            return b""
+        return view[offset : offset + length]
+
+    def new_entries(self) -> Iterator[Tuple[Tuple, int]]:
+        """Reads all complete entries that were appended since the last call,
+        a partially written last entry is skipped until it is complete
+
+        Yields:
+            Iterator[Tuple[Tuple, int]]: the header fields and the position of the payload
+        """
+        view = self._view()
+        end = self._mapped_size
+        while self.position + self.header.size <= end:
+            fields = self.header.unpack_from(view, self.position)
+            payload_offset = self.position + self.header.size
+            entry_end = payload_offset + sum(fields[1:])
+            if entry_end > end:
+                return
+            self.position = entry_end
+            yield fields, payload_offset
+
+    def append(self, entries: List[bytes]):
+        """Appends entries, the caller needs to hold the write lock
+        and to have read all complete entries
+
+        Args:
+            entries (List[bytes]): encoded entries including their headers
+        """
+        if os.fstat(self._file.fileno()).st_size > self.position:
+            # left over by a writer that crashed in the middle of an entry
+            self._file.truncate(self.position)
+        self._file.write(b"".join(entries))
+        self._file.flush()
+
+
+class LocalStorage(Storage):
+    """Stores the vault in local append-only files"""
+
+    def __init__(self, path: str, segment_size: int = LOCAL_SEGMENT_SIZE):
+        """
+        Args:
+            path (str): directory of the files, created if it doesn't exist
+            segment_size (int, optional): size in bytes after which a new index segment
+            is started. Defaults to LOCAL_SEGMENT_SIZE.
+        """
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.segment_size = segment_size
+        self._records = _Log(os.path.join(path, "records.log"), RECORD_HEADER)
+        self._users_log = _Log(os.path.join(path, "users.log"), USER_HEADER)
+        self._segments = [_Log(self._segment_path(0), INDEX_HEADER)]
+        self._lock_file = open(  # pylint: disable=consider-using-with
+            os.path.join(path, "lock"), "a+b"
+        )
+        self._counter = os.open(
+            os.path.join(path, "record-ids"), os.O_RDWR | os.O_CREAT, 0o644
+        )
+        self._lock = threading.RLock()
+        self._record_ids: List[int] = []
+        # segment number, offset and length of the index entry of every record
+        self._index_locations: Dict[int, Tuple[int, int, int]] = {}
+        # offset, pseudonym length and record length of every record
+        self._record_locations: Dict[int, Tuple[int, int, int]] = {}
+        # record id of every pseudonym
+        self._pseudonym_ids: Dict[str, int] = {}
+        self._users: Dict[int, str] = {}
+        self._refresh()
+
+    def _segment_path(self, segment_number: int) -> str:
+        return os.path.join(self.path, f"index-{segment_number:06d}.seg")
+
+    @contextmanager
+    def _write_lock(self):
+        """Serializes writers of this and of other processes"""
+        with self._lock:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        """Reads all entries that were appended since the last refresh"""
+        with self._lock:
+            for fields, offset in self._records.new_entries():
+                record_id, pseudonym_length, record_length = fields
+                self._record_locations[record_id] = (
+                    offset,
+                    pseudonym_length,
+                    record_length,
+                )
+                pseudonym = self._records.read(offset, pseudonym_length).decode()
+                self._pseudonym_ids[pseudonym] = record_id
+            while True:
+                segment_number = len(self._segments) - 1
+                for (record_id, length), offset in self._segments[-1].new_entries():
+                    self._index_locations[record_id] = (segment_number, offset, length)
+                    if self._record_ids and record_id < self._record_ids[-1]:
+                        # concurrent writers may finish out of order
+                        insort(self._record_ids, record_id)
+                    else:
+                        self._record_ids.append(record_id)
+                next_path = self._segment_path(segment_number + 1)
+                if not os.path.exists(next_path):
+                    break
+                self._segments.append(_Log(next_path, INDEX_HEADER))
+            for (user_id, key_length), offset in self._users_log.new_entries():
+                if key_length:
+                    com_k = self._users_log.read(offset, key_length).decode()
+                    self._users[user_id] = com_k
+                else:
+                    self._users.pop(user_id, None)
+
+    def prepare(self) -> int:
+        """Reads the entries written by other processes, local storage
+        needs no migrations
+
+        Returns:
+            int: always 0
+        """
+        self._refresh()
+        return 0
+
+    def reserve_ids(self, amount: int) -> int:
+        """Reserves a range of consecutive record ids
+
+        Args:
+            amount (int): amount of ids to reserve
+
+        Returns:
+            int: the largest reserved id
+        """
+        with self._write_lock():
+            stored_id = os.pread(self._counter, RECORD_ID_COUNTER.size, 0)
+            if len(stored_id) == RECORD_ID_COUNTER.size:
+                last_id = RECORD_ID_COUNTER.unpack(stored_id)[0]
+            else:
+                self._refresh()
+                last_id = self._record_ids[-1] if self._record_ids else 0
+            last_id += amount
+            os.pwrite(self._counter, RECORD_ID_COUNTER.pack(last_id), 0)
+            return last_id
+
+    def write_records(self, records: List[StoredRecord]):
+        """Appends the records to the record log and their index entries
+        to the current index segment
+
+        Args:
+            records (List[StoredRecord]): the records to store
+        """
+        record_entries = []
+        index_entries = []
+        for record_id, pseudonym, record, grouped_indices in records:
+            encoded_pseudonym = pseudonym.encode()
+            encoded_record = record.encode()
+            record_entries.append(
+                RECORD_HEADER.pack(
+                    record_id, len(encoded_pseudonym), len(encoded_record)
+                )
+                + encoded_pseudonym
+                + encoded_record
+            )
+            packed_indices = pack_indices(grouped_indices)
+            index_entries.append(
+                INDEX_HEADER.pack(record_id, len(packed_indices)) + packed_indices
+            )
+        with self._write_lock():
+            self._refresh()
+            self._records.append(record_entries)
+            if self._segments[-1].position >= self.segment_size:
+                self._segments.append(
+                    _Log(self._segment_path(len(self._segments)), INDEX_HEADER)
+                )
+            self._segments[-1].append(index_entries)
+            self._refresh()
+
+    def record_count(self) -> int:
+        """Returns the amount of stored records
+
+        Returns:
+            int: amount of records
+        """
+        self._refresh()
+        return len(self._record_ids)
+
+    def record_ids(
+        self,
+        first_id: Optional[int] = None,
+        last_id: Optional[int] = None,
+        batch_size: int = SEARCH_BATCH_SIZE,
+    ) -> Iterator[int]:
+        """Enumerates the stored record ids within an id range in ascending order
+
+        Args:
+            first_id (Optional[int], optional): smallest record id. Defaults to None.
+            last_id (Optional[int], optional): largest record id. Defaults to None.
+            batch_size (int, optional): unused, all ids are kept in memory.
+            Defaults to SEARCH_BATCH_SIZE.
+
+        Yields:
+            Iterator[int]: record ids
+        """
+        self._refresh()
+        with self._lock:
+            record_ids = self._record_ids
+            start = 0 if first_id is None else bisect_left(record_ids, first_id)
+            end = (
+                len(record_ids)
+                if last_id is None
+                else bisect_right(record_ids, last_id)
+            )
+            selected_ids = record_ids[start:end]
+        yield from selected_ids
+
+    def load_indices(
+        self, record_ids: List[int], batch_size: int = SEARCH_BATCH_SIZE
+    ) -> Iterator[Tuple[int, IndexGroups]]:
+        """Unpacks the index entries of the given records from the mapped index segments
+
+        Args:
+            record_ids (List[int]): ids of the records to load
+            batch_size (int, optional): unused, entries are read from memory maps.
+            Defaults to SEARCH_BATCH_SIZE.
+
+        Yields:
+            Iterator[Tuple[int, IndexGroups]]: record id and its parsed indices,
+            ids without a record are skipped
+        """
+        self._refresh()
+        for record_id in record_ids:
+            location = self._index_locations.get(record_id)
+            if location is not None:
+                segment_number, offset, length = location
+                indices = self._segments[segment_number].read(offset, length)
+                yield record_id, unpack_indices(indices)
+
+    def fetch_records(self, record_ids: List[int]) -> List[Tuple[str, str]]:
+        """Reads the encrypted record and pseudonym of the given records
+
+        Args:
+            record_ids (List[int]): ids of the records
+
+        Returns:
+            List[Tuple[str, str]]: encrypted record and pseudonym for every id,
+            None for both if a record doesn't exist
+        """
+        self._refresh()
+        records = []
+        for record_id in record_ids:
+            location = self._record_locations.get(record_id)
+            if location is None:
+                records.append((None, None))
+                continue
+            offset, pseudonym_length, record_length = location
+            data = self._records.read(offset, pseudonym_length + record_length)
+            records.append(
+                (data[pseudonym_length:].decode(), data[:pseudonym_length].decode())
+            )
+        return records
+
+    def find_record_ids(self, pseudonyms: List[str]) -> List[Optional[int]]:
+        """Looks up the records of the given pseudonyms in the in-memory pseudonym index
+        that is built from the record log
+
+        Args:
+            pseudonyms (List[str]): pseudonyms of records
+
+        Returns:
+            List[Optional[int]]: record id for every pseudonym, None for unknown pseudonyms
+        """
+        self._refresh()
+        with self._lock:
+            return [self._pseudonym_ids.get(pseudonym) for pseudonym in pseudonyms]
+
+    def get_user_key(self, user_id: int) -> Optional[str]:
+        """Returns the complementary key of a user
+
+        Args:
+            user_id (int): user identifier
+
+        Returns:
+            Optional[str]: the serialized complementary key, None for unknown users
+        """
+        self._refresh()
+        return self._users.get(user_id)
+
+    def set_user_key(self, user_id: int, com_k: Union[str, bytes]) -> bool:
+        """Appends the complementary key of a user to the user log
+
+        Args:
+            user_id (int): user identifier
+            com_k (Union[str, bytes]): serialized complementary key
+
+        Returns:
+            bool: true if the key was stored
+        """
+        if isinstance(com_k, str):
+            com_k = com_k.encode()
+        if not com_k:
+            return False
+        with self._write_lock():
+            self._refresh()
+            self._users_log.append([USER_HEADER.pack(user_id, len(com_k)) + com_k])
+            self._refresh()
+        return True
+
+    def delete_user_key(self, user_id: int) -> bool:
+        """Appends the deletion of the complementary key of a user to the user log
+
+        Args:
+            user_id (int): user identifier
+
+        Returns:
+            bool: true if the user had a key that was deleted
+        """
+        with self._write_lock():
+            self._refresh()
+            if user_id not in self._users:
+                return False
+            self._users_log.append([USER_HEADER.pack(user_id, 0)])
+            self._refresh()
+        return True
+
+    def user_keys(self) -> Iterator[Tuple[int, str]]:
+        """Enumerates the complementary keys of all users
+
+        Yields:
+            Iterator[Tuple[int, str]]: user identifier and serialized complementary key
+        """
+        self._refresh()
+        with self._lock:
+            users = list(self._users.items())
+        yield from users
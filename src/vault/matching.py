@@ -0,0 +1,232 @@
+"""Matching of search tokens against the parsed indices of records"""
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from constants import METRICS_ENABLED, SEARCH_BATCH_SIZE
+from aliases import IndexGroups, Search
+from indices import SearchToken, is_match
+from snapshot import snapshot
+from util import batched
+import metrics
+
+Matcher = Callable[[IndexGroups], bool]
+
+if METRICS_ENABLED:
+    # only counted while metrics are enabled, so the matchers pay nothing otherwise
+    is_match = metrics.counted(is_match, metrics.index_entries_decrypted)
+
+
+def exact_matcher(decryption_keys: List[bytes]) -> Matcher:
+    """Builds a matcher that accepts records containing every search word
+
+    Args:
+        decryption_keys (List[bytes]): a decryption key for every search word
+
+    Returns:
+        Matcher: function that checks the indices of a single record
+    """
+    tokens = [SearchToken(index_key) for index_key in decryption_keys]
+
+    def matches(grouped_indices: IndexGroups) -> bool:
+        query_hits = 0
+        for token in tokens:
+            for indices in grouped_indices:
+                for index in indices:
+                    if is_match(token, index):
+                        query_hits += 1
+        return len(tokens) == query_hits and query_hits > 0
+
+    return matches
+
+
+def max_assigned_keywords(candidate_fields: List[List[int]]) -> int:
+    """Computes how many keywords can be assigned to pairwise different fields
+    (maximum bipartite matching with augmenting paths)
+
+    Args:
+        candidate_fields (List[List[int]]): the fields each keyword matches
+
+    Returns:
+        int: the maximum amount of keywords matching distinct fields
+    """
+    field_owners: Dict[int, int] = {}
+
+    def assign(keyword: int, visited_fields: Set[int]) -> bool:
+        for field in candidate_fields[keyword]:
+            if field not in visited_fields:
+                visited_fields.add(field)
+                if field not in field_owners or assign(
+                    field_owners[field], visited_fields
+                ):
+                    field_owners[field] = keyword
+                    return True
+        return False
+
+    return sum(assign(keyword, set()) for keyword in range(len(candidate_fields)))
+
+
+def fuzzy_matcher(
+    search_keys: List[List[bytes]], min_matching_keywords: int
+) -> Matcher:
+    """Builds a matcher that accepts records where wildcards of at least
+    min_matching_keywords keywords match, each keyword in a different field.
+    Works for any amount of keywords and fields, every wildcard token is checked
+    at most once per index entry
+
+    Args:
+        search_keys (List[List[bytes]]): decryption keys for the wildcards of every keyword
+        min_matching_keywords (int): amount of keywords that need to match
+
+    Returns:
+        Matcher: function that checks the indices of a single record
+    """
+    search_tokens = [
+        [SearchToken(search_key) for search_key in keyword_keys]
+        for keyword_keys in search_keys
+    ]
+    allowed_misses = len(search_tokens) - min_matching_keywords
+
+    def field_matches(tokens: List[SearchToken], indices: Tuple) -> bool:
+        for index in indices:
+            for token in tokens:
+                if is_match(token, index):
+                    return True
+        return False
+
+    def matches(grouped_indices: IndexGroups) -> bool:
+        if min_matching_keywords <= 0 or allowed_misses < 0:
+            return False
+        candidate_fields = []
+        misses = 0
+        for tokens in search_tokens:
+            fields = [
+                field
+                for field, indices in enumerate(grouped_indices)
+                if field_matches(tokens, indices)
+            ]
+            if not fields:
+                misses += 1
+                if misses > allowed_misses:
+                    return False
+            candidate_fields.append(fields)
+        return max_assigned_keywords(candidate_fields) >= min_matching_keywords
+
+    return matches
+
+
+def build_matcher(
+    search_keys: List[List[bytes]], is_fuzzy: bool, expected_amount_of_keywords: int
+) -> Matcher:
+    """Builds the matcher for an exact or a fuzzy search
+
+    Args:
+        search_keys (List[List[bytes]]): decryption keys, for an exact search
+        only the first list is used
+        is_fuzzy (bool): if the search is fuzzy
+        expected_amount_of_keywords (int): amount of keywords that need to match,
+        for a fuzzy search this is the k of a k-of-n match
+
+    Returns:
+        Matcher: function that checks the indices of a single record
+    """
+    if is_fuzzy:
+        return fuzzy_matcher(search_keys, expected_amount_of_keywords)
+    return exact_matcher(search_keys[0])
+
+
+def iter_matches(
+    searches: List[Search],
+    batch_size: int = SEARCH_BATCH_SIZE,
+    first_id: Optional[int] = None,
+    last_id: Optional[int] = None,
+    checked_ids: Optional[List[int]] = None,
+) -> Iterator[List[List[int]]]:
+    """Checks all records of the snapshot, or the records within an id range,
+    for every search in a single pass over the records and reports the matches
+    after every batch of records. A search stops being checked once it reached
+    its limit, the pass ends as soon as every search reached its limit
+
+    Args:
+        searches (List[Search]): the searches to execute
+        batch_size (int, optional): records checked per batch, also the records loaded
+        per round trip for records missing in the snapshot. Defaults to SEARCH_BATCH_SIZE.
+        first_id (Optional[int], optional): smallest record id to check. Defaults to None.
+        last_id (Optional[int], optional): largest record id to check. Defaults to None.
+        checked_ids (Optional[List[int]], optional): for every search the record id up to
+        which it was already checked, only later records are checked. Defaults to None.
+
+    Yields:
+        Iterator[List[List[int]]]: ascending ids of the matching records of a batch
+        for every search
+    """
+    if checked_ids is None:
+        checked_ids = [0 for _ in searches]
+    elif checked_ids:
+        first_id = max(first_id or 0, min(checked_ids) + 1)
+    matchers = [build_matcher(*search[:3]) for search in searches]
+    # None for searches without a limit
+    remaining_matches = [search[3] for search in searches]
+    records = snapshot.records(batch_size, first_id, last_id)
+    for record_batch in batched(records, batch_size):
+        if METRICS_ENABLED:
+            metrics.records_scanned.inc(len(record_batch))
+        matches: List[List[int]] = [[] for _ in searches]
+        for record_id, grouped_indices in record_batch:
+            for search_number, matcher in enumerate(matchers):
+                if (
+                    remaining_matches[search_number] != 0
+                    and record_id > checked_ids[search_number]
+                    and matcher(grouped_indices)
+                ):
+                    matches[search_number].append(record_id)
+                    if remaining_matches[search_number] is not None:
+                        remaining_matches[search_number] -= 1
+            if all(remaining == 0 for remaining in remaining_matches):
+                yield matches
+                return
+        yield matches
+
+
+def merge_matches(
+    match_batches: Iterable[List[List[int]]], amount_of_searches: int
+) -> List[List[int]]:
+    """Concatenates the matches of consecutive batches for every search
+
+    Args:
+        match_batches (Iterable[List[List[int]]]): matches of every batch
+        amount_of_searches (int): amount of executed searches
+
+    Returns:
+        List[List[int]]: the matches of all batches for every search
+    """
+    matches: List[List[int]] = [[] for _ in range(amount_of_searches)]
+    for match_batch in match_batches:
+        for search_matches, batch_matches in zip(matches, match_batch):
+            search_matches.extend(batch_matches)
+    return matches
+
+
+def find_matches(
+    searches: List[Search],
+    batch_size: int = SEARCH_BATCH_SIZE,
+    first_id: Optional[int] = None,
+    last_id: Optional[int] = None,
+    checked_ids: Optional[List[int]] = None,
+) -> List[List[int]]:
+    """Checks all records of the snapshot, or the records within an id range,
+    for every search in a single pass over the records
+
+    Args:
+        searches (List[Search]): the searches to execute
+        batch_size (int, optional): records loaded per round trip for records
+        missing in the snapshot. Defaults to SEARCH_BATCH_SIZE.
+        first_id (Optional[int], optional): smallest record id to check. Defaults to None.
+        last_id (Optional[int], optional): largest record id to check. Defaults to None.
+        checked_ids (Optional[List[int]], optional): for every search the record id up to
+        which it was already checked, only later records are checked. Defaults to None.
+
+    Returns:
+        List[List[int]]: ascending ids of the matching records for every search
+    """
+    return merge_matches(
+        iter_matches(searches, batch_size, first_id, last_id, checked_ids),
+        len(searches),
+    )
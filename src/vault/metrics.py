@@ -0,0 +1,232 @@
+"""Metrics of the vault in the Prometheus text format. Nothing is measured unless
+METRICS_ENABLED is set, otherwise timers are a shared no-op, counters ignore
+increments and the matchers run without counting wrappers"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Tuple
+from constants import METRICS_ENABLED
+
+# upper bounds of the histogram buckets in seconds
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+
+class Counter:
+    """Monotonically increasing counter"""
+
+    def __init__(self, name: str, documentation: str):
+        """
+        Args:
+            name (str): metric name
+            documentation (str): help text of the metric
+        """
+        self.name = name
+        self.documentation = documentation
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1):
+        """Increases the counter
+
+        Args:
+            amount (int, optional): the increment. Defaults to 1.
+        """
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self.value += amount
+
+    def take(self) -> int:
+        """Returns the current value and resets the counter
+
+        Returns:
+            int: the value before the reset
+        """
+        with self._lock:
+            value, self.value = self.value, 0
+            return value
+
+    def expose(self) -> List[str]:
+        """Formats the counter in the Prometheus text format
+
+        Returns:
+            List[str]: the lines of the metric
+        """
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+            f"{self.name} {self.value}",
+        ]
+
+
+class Histogram:
+    """Histogram of durations per operation and stage"""
+
+    def __init__(self, name: str, documentation: str):
+        """
+        Args:
+            name (str): metric name
+            documentation (str): help text of the metric
+        """
+        self.name = name
+        self.documentation = documentation
+        # bucket counts, sum and count for every (operation, stage)
+        self._series: Dict[Tuple[str, str], List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Tuple[str, str], seconds: float):
+        """Records a duration
+
+        Args:
+            labels (Tuple[str, str]): operation and stage
+            seconds (float): the measured duration
+        """
+        bucket = bisect_left(STAGE_BUCKETS, seconds)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = [[0] * (len(STAGE_BUCKETS) + 1), 0.0, 0]
+                self._series[labels] = series
+            series[0][bucket] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def expose(self) -> List[str]:
+        """Formats the histogram in the Prometheus text format
+
+        Returns:
+            List[str]: the lines of the metric
+        """
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            series = sorted(
+                (labels, buckets[:], total, count)
+                for labels, (buckets, total, count) in self._series.items()
+            )
+        for (operation, stage), buckets, total, count in series:
+            labels = f'operation="{operation}",stage="{stage}"'
+            cumulative = 0
+            for upper_bound, bucket_count in zip(STAGE_BUCKETS, buckets):
+                cumulative += bucket_count
+                lines.append(
+                    f'{self.name}_bucket{{{labels},le="{upper_bound}"}} {cumulative}'
+                )
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+
+class _Timer:
+    """Measures the duration of a with block"""
+
+    __slots__ = ("labels", "start")
+
+    def __init__(self, labels: Tuple[str, str]):
+        self.labels = labels
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        stage_seconds.observe(self.labels, time.perf_counter() - self.start)
+
+
+class _NoTimer:
+    """Timer used while metrics are disabled"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        pass
+
+
+_NO_TIMER = _NoTimer()
+
+stage_seconds = Histogram(
+    "vault_stage_duration_seconds", "Duration of the stages of vault operations"
+)
+records_scanned = Counter(
+    "vault_records_scanned_total", "Records whose indices were checked by a search"
+)
+index_entries_decrypted = Counter(
+    "vault_index_entries_decrypted_total",
+    "Index entries checked against a search token",
+)
+matches_found = Counter("vault_matches_found_total", "Records matching a search")
+COUNTERS = (records_scanned, index_entries_decrypted, matches_found)
+
+
+def timed(operation: str, stage: str):
+    """Times a stage of an operation, e.g. with timed("search", "match"): ...
+
+    Args:
+        operation (str): the operation, e.g. search or add_record
+        stage (str): the stage of the operation
+
+    Returns:
+        a context manager that records the duration of its block
+    """
+    if not METRICS_ENABLED:
+        return _NO_TIMER
+    return _Timer((operation, stage))
+
+
+def counted(function: Callable, counter: Counter) -> Callable:
+    """Wraps a function so that every call increases a counter,
+    only meant to be installed while metrics are enabled
+
+    Args:
+        function (Callable): the function to wrap
+        counter (Counter): the counter to increase
+
+    Returns:
+        Callable: the wrapped function
+    """
+
+    def wrapper(*args):
+        counter.inc()
+        return function(*args)
+
+    return wrapper
+
+
+def take_counts() -> List[int]:
+    """Returns and resets all counters, used to hand the counts of a worker
+    process to the api process
+
+    Returns:
+        List[int]: the value of every counter
+    """
+    return [counter.take() for counter in COUNTERS]
+
+
+def add_counts(counts: List[int]):
+    """Adds counts taken in a worker process
+
+    Args:
+        counts (List[int]): the value of every counter
+    """
+    for counter, amount in zip(COUNTERS, counts):
+        if amount:
+            counter.inc(amount)
+
+
+def expose() -> str:
+    """Formats all metrics in the Prometheus text format
+
+    Returns:
+        str: the metrics
+    """
+    lines = stage_seconds.expose()
+    for counter in COUNTERS:
+        lines.extend(counter.expose())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,103 @@
+"""Moves the index entries of records on redis out of the record hashes into
+separate strings in the packed layout, while the vault keeps running. Record hashes
+may hold one 'index:{k}: {n}' field per entry or a packed 'indices' field.
+The vault never changes records after writing them and reads every layout, so each
+record is converted with a single atomic SET and HDEL. Running the conversion again
+skips converted records.
+
+Usage: python migrate_indices.py [batch size]"""
+import sys
+from typing import List, Tuple
+from constants import SEARCH_BATCH_SIZE, STORAGE_BACKEND
+from db import storage
+from indices import group_indices, pack_indices
+from redis_storage import PACKED_INDICES_FIELD, indices_key, record_key
+from util import batched
+
+
+def migrate_batch(record_ids: List[int]) -> Tuple[int, int, int]:
+    """Converts a batch of records with one pipelined transaction
+
+    Args:
+        record_ids (List[int]): ids of the records to convert
+
+    Returns:
+        Tuple[int, int, int]: amount of converted records and their memory usage
+        in bytes before and after the conversion
+    """
+    database = storage.database
+    binary_database = storage.binary_database
+    pipe = database.pipeline(transaction=False)
+    for record_id in record_ids:
+        pipe.exists(indices_key(record_id))
+    former_ids = [
+        record_id
+        for record_id, converted in zip(record_ids, pipe.execute())
+        if not converted
+    ]
+    if not former_ids:
+        return 0, 0, 0
+    pipe = binary_database.pipeline(transaction=False)
+    for record_id in former_ids:
+        pipe.hget(record_key(record_id), PACKED_INDICES_FIELD)
+        pipe.memory_usage(record_key(record_id))
+    replies = pipe.execute()
+    # record id, packed indices, fields to delete and the memory usage before
+    conversions = []
+    field_ids = []
+    for record_id, packed, memory_usage in zip(former_ids, replies[::2], replies[1::2]):
+        if packed is not None:
+            conversions.append(
+                (record_id, packed, [PACKED_INDICES_FIELD], memory_usage)
+            )
+        elif memory_usage is not None:
+            field_ids.append((record_id, memory_usage))
+    pipe = database.pipeline(transaction=False)
+    for record_id, _ in field_ids:
+        pipe.hgetall(record_key(record_id))
+    for (record_id, memory_usage), record in zip(field_ids, pipe.execute()):
+        index_fields = [field for field in record if field.startswith("index:")]
+        conversions.append(
+            (record_id, pack_indices(group_indices(record)), index_fields, memory_usage)
+        )
+    pipe = database.pipeline(transaction=True)
+    for record_id, packed, fields, _ in conversions:
+        pipe.set(indices_key(record_id), packed)
+        if fields:
+            pipe.hdel(record_key(record_id), *fields)
+    pipe.execute()
+    pipe = database.pipeline(transaction=False)
+    for record_id, _, _, _ in conversions:
+        pipe.memory_usage(record_key(record_id))
+        pipe.memory_usage(indices_key(record_id))
+    memory_after = sum(usage or 0 for usage in pipe.execute())
+    memory_before = sum(usage for _, _, _, usage in conversions)
+    return len(conversions), memory_before, memory_after
+
+
+def migrate(batch_size: int = SEARCH_BATCH_SIZE) -> Tuple[int, int, int]:
+    """Converts all registered records
+
+    Args:
+        batch_size (int, optional): records converted per transaction.
+        Defaults to SEARCH_BATCH_SIZE.
+
+    Returns:
+        Tuple[int, int, int]: amount of converted records and their memory usage
+        in bytes before and after the conversion
+    """
+    storage.prepare()
+    totals = [0, 0, 0]
+    for id_batch in batched(storage.record_ids(batch_size=batch_size), batch_size):
+        for position, amount in enumerate(migrate_batch(id_batch)):
+            totals[position] += amount
+    return totals[0], totals[1], totals[2]
+
+
+if __name__ == "__main__":
+    if STORAGE_BACKEND != "redis":
+        sys.exit("Only the redis storage has records in a former layout")
+    converted, before, after = migrate(
+        int(sys.argv[1]) if len(sys.argv) > 1 else SEARCH_BATCH_SIZE
+    )
+    print(f"converted {converted} records from {before} to {after} bytes")
@@ -1,6 +1,6 @@
 """Models used for the api"""
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field
+from typing import List, Optional
 
 
 class SearchRequest(BaseModel):
@@ -8,6 +8,10 @@ class SearchRequest(BaseModel):
     queries: List[List[str]]
     is_fuzzy: bool
     expected_amount_of_keywords: int
+    # fuzzy searches only, defaults to expected_amount_of_keywords
+    min_matching_keywords: Optional[int] = None
+    # stop searching after this many matches, None finds all matches
+    limit: Optional[int] = Field(default=None, gt=0)
 
 
 class AddRequest(BaseModel):
@@ -18,3 +22,22 @@ class AddRequest(BaseModel):
 class IndexRequest(BaseModel):
     user_id: int
     hashed_keywords: List[str]
+
+
+class BatchIndexRequest(BaseModel):
+    user_id: int
+    # e.g. the keywords of a record and every wildcard list of a fuzzy record
+    keyword_groups: List[List[str]]
+
+
+class BatchSearchRequest(BaseModel):
+    requests: List[SearchRequest]
+
+
+class BatchAddRequest(BaseModel):
+    records: List[AddRequest]
+
+
+class RecordLookupRequest(BaseModel):
+    user_id: int
+    pseudonyms: List[str]
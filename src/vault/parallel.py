@@ -0,0 +1,255 @@
+"""Sharded search and index generation on multiple cores. Every worker process keeps
+its own index snapshot, so a search only sends the decryption keys and the id range
+of a shard to a worker"""
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from bisect import bisect_right
+from itertools import chain
+from typing import Iterator, List, Optional, Tuple
+from constants import COMPLEMENTARY_KEY_CACHE_SIZE, SEARCH_WORKERS
+from matching import find_matches, iter_matches
+from aliases import Search
+from cache import LRUCache
+from keys import ComplementaryKey
+from snapshot import snapshot
+from util import batched
+import metrics
+
+# smaller index requests are paired in the api process
+MIN_PAIRINGS_PER_WORKER = 4
+
+_pool: Optional[ProcessPoolExecutor] = None
+_workers = 0
+# held while the pool is swapped and while tasks are submitted, so that no task
+# is submitted to a pool that is shutting down
+_pool_lock = threading.Lock()
+# deserialized complementary keys of a worker, keyed by user and serialized key
+_worker_keys = LRUCache(COMPLEMENTARY_KEY_CACHE_SIZE)
+
+
+def _init_worker():
+    """Prepares the snapshot of a worker. A forked worker inherits the snapshot
+    of the vault, a spawned one loads it from the database"""
+    # the lock may have been held by another thread at the time of the fork
+    snapshot._lock = threading.Lock()  # pylint: disable=protected-access
+    # counts inherited from the vault must not be reported twice
+    metrics.take_counts()
+    if not snapshot.record_ids():
+        snapshot.rebuild()
+
+
+def _ping():
+    """Empty task to start a worker"""
+
+
+def _search_shard(
+    searches: List[Search],
+    first_id: int,
+    last_id: int,
+    last_record_id: int,
+    generation: int,
+    checked_ids: Optional[List[int]] = None,
+) -> Tuple[List[List[int]], List[int]]:
+    """Searches the records of a single shard, runs inside a worker process
+
+    Args:
+        searches (List[Search]): the searches to execute
+        first_id (int): smallest record id of the shard
+        last_id (int): largest record id of the shard
+        last_record_id (int): largest record id known to the vault
+        generation (int): snapshot generation of the vault, the worker compares all
+        record ids once it changed, so that records written out of order are found
+        checked_ids (Optional[List[int]], optional): for every search the record id up to
+        which it was already checked. Defaults to None.
+
+    Returns:
+        Tuple[List[List[int]], List[int]]: ascending ids of the matching records
+        in this shard for every search and the metric counts of the worker
+    """
+    snapshot.sync(last_record_id, generation)
+    matches = find_matches(
+        searches, first_id=first_id, last_id=last_id, checked_ids=checked_ids
+    )
+    return matches, metrics.take_counts()
+
+
+def _pair_chunk(user_id: int, com_k: bytes, elements: List[str]) -> List[bytes]:
+    """Pairs a chunk of serialized group elements with the complementary key of a user,
+    runs inside a worker process
+
+    Args:
+        user_id (int): user identifier
+        com_k (bytes): serialized complementary key of the user
+        elements (List[str]): serialized group elements
+
+    Returns:
+        List[bytes]: the serialized pairing results
+    """
+    complementary_key = _worker_keys.get((user_id, com_k))
+    if complementary_key is None:
+        complementary_key = ComplementaryKey(user_id, com_k)
+        _worker_keys.put((user_id, com_k), complementary_key)
+    return complementary_key.pair_all_serialized(elements)
+
+
+def _create_pool(workers: int) -> ProcessPoolExecutor:
+    """Creates a pool of worker processes and starts every worker right away
+    instead of on the first search
+
+    Args:
+        workers (int): amount of worker processes
+
+    Returns:
+        ProcessPoolExecutor: the started pool
+    """
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+    for future in [pool.submit(_ping) for _ in range(workers)]:
+        future.result()
+    return pool
+
+
+def _replace_pool(pool: Optional[ProcessPoolExecutor], workers: int):
+    """Swaps in a pool of worker processes and shuts the previous pool down once
+    the tasks that were already submitted to it are done
+
+    Args:
+        pool (Optional[ProcessPoolExecutor]): the new pool, None to stop the workers
+        workers (int): amount of worker processes of the new pool
+    """
+    global _pool, _workers  # pylint: disable=global-statement
+    with _pool_lock:
+        previous_pool = _pool
+        _pool = pool
+        _workers = workers if pool is not None else 0
+    if previous_pool is not None:
+        previous_pool.shutdown(wait=True)
+
+
+def start_workers(workers: int = SEARCH_WORKERS):
+    """Starts the worker processes, does nothing if no workers are configured
+
+    Args:
+        workers (int, optional): amount of worker processes. Defaults to SEARCH_WORKERS.
+    """
+    if workers <= 0 or _pool is not None:
+        return
+    _replace_pool(_create_pool(workers), workers)
+
+
+def stop_workers():
+    """Stops all worker processes"""
+    _replace_pool(None, 0)
+
+
+def restart_workers(workers: int = SEARCH_WORKERS):
+    """Restarts the worker processes, so that they load a fresh snapshot.
+    The new workers are started before the previous ones are stopped, so searches
+    keep running on the previous workers meanwhile
+
+    Args:
+        workers (int, optional): amount of worker processes. Defaults to SEARCH_WORKERS.
+    """
+    _replace_pool(_create_pool(workers) if workers > 0 else None, workers)
+
+
+def is_enabled() -> bool:
+    """Checks if searches are executed by worker processes
+
+    Returns:
+        bool: true if worker processes are running
+    """
+    return _pool is not None
+
+
+def iter_matches_parallel(
+    searches: List[Search],
+    last_id: Optional[int] = None,
+    checked_ids: Optional[List[int]] = None,
+) -> Iterator[List[List[int]]]:
+    """Splits the records into one shard per worker and searches them in parallel,
+    the matches of every shard are reported in shard order as soon as they are known.
+    Every shard stops at the limit of a search, matches beyond it are dropped
+
+    Args:
+        searches (List[Search]): the searches to execute
+        last_id (Optional[int], optional): largest record id to check. Defaults to None.
+        checked_ids (Optional[List[int]], optional): for every search the record id up to
+        which it was already checked, only later records are split into shards.
+        Defaults to None.
+
+    Yields:
+        Iterator[List[List[int]]]: ascending ids of the matching records of a shard
+        for every search
+    """
+    generation = snapshot.generation
+    record_ids = snapshot.record_ids()
+    first = bisect_right(record_ids, min(checked_ids)) if checked_ids else 0
+    end = len(record_ids) if last_id is None else bisect_right(record_ids, last_id)
+    record_ids = record_ids[first:end]
+    if not record_ids:
+        return
+    with _pool_lock:
+        if _pool is None:
+            futures = None
+        else:
+            shard_size = -(-len(record_ids) // _workers)
+            futures = [
+                _pool.submit(
+                    _search_shard,
+                    searches,
+                    record_ids[start],
+                    record_ids[min(start + shard_size, len(record_ids)) - 1],
+                    record_ids[-1],
+                    generation,
+                    checked_ids,
+                )
+                for start in range(0, len(record_ids), shard_size)
+            ]
+    if futures is None:
+        # the workers were stopped after the search started
+        yield from iter_matches(searches, last_id=last_id, checked_ids=checked_ids)
+        return
+    remaining_matches = [search[3] for search in searches]
+    try:
+        for future in futures:
+            shard_matches, counts = future.result()
+            metrics.add_counts(counts)
+            for search_number, search_matches in enumerate(shard_matches):
+                remaining = remaining_matches[search_number]
+                if remaining is not None:
+                    del search_matches[remaining:]
+                    remaining_matches[search_number] = remaining - len(search_matches)
+            yield shard_matches
+            if all(remaining == 0 for remaining in remaining_matches):
+                return
+    finally:
+        # shards that didn't start yet are not needed anymore
+        for future in futures:
+            future.cancel()
+
+
+def pair_all_parallel(com_k: ComplementaryKey, elements: List[str]) -> List[bytes]:
+    """Pairs serialized group elements with the complementary key of a user,
+    split into one chunk per worker if the worker processes are enabled
+
+    Args:
+        com_k (ComplementaryKey): complementary key of the user
+        elements (List[str]): serialized group elements
+
+    Returns:
+        List[bytes]: the serialized pairing results in the order of the elements
+    """
+    if len(elements) < 2 * MIN_PAIRINGS_PER_WORKER:
+        return com_k.pair_all_serialized(elements)
+    with _pool_lock:
+        if _pool is None:
+            futures = None
+        else:
+            chunk_size = max(-(-len(elements) // _workers), MIN_PAIRINGS_PER_WORKER)
+            futures = [
+                _pool.submit(_pair_chunk, com_k.user_id, com_k.serialized_com_k, chunk)
+                for chunk in batched(elements, chunk_size)
+            ]
+    if futures is None:
+        return com_k.pair_all_serialized(elements)
+    return list(chain.from_iterable(future.result() for future in futures))
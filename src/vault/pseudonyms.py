@@ -1,22 +1,162 @@
-"""Module that produces truly random pseudonyms"""
-import secrets
+"""Module that produces truly random pseudonyms. Randomness is drawn in bulk from
+os.urandom and new pseudonyms are taken from a pool that is refilled in the background,
+so that adding many records at once doesn't wait on their generation"""
+import os
 import string
+import threading
+from collections import deque
+from typing import Callable, Deque, List, Optional, Set
+from constants import PSEUDONYM_POOL_SIZE
 
+ALPHABET = string.ascii_uppercase + string.digits
+PSEUDONYM_LENGTH = 16
+# random bytes from the largest multiple of the alphabet size upwards are discarded,
+# so that mapping the remaining bytes modulo the alphabet size is free of bias
+_ACCEPTED_BYTES = 256 - 256 % len(ALPHABET)
+_REJECTED_BYTES = bytes(range(_ACCEPTED_BYTES, 256))
+_CHARACTERS = bytes(ord(ALPHABET[byte % len(ALPHABET)]) for byte in range(256))
 
-def generate_pseudonym(record: str) -> str:
-    return generate_random_string(16)
 
-
-def generate_random_string(length: int) -> str:
-    """Generate a random string for a given length.
+def generate_random_strings(amount: int, length: int) -> List[str]:
+    """Generate random strings of the same length from one os.urandom call,
+    apart from the rare calls needed to replace rejected bytes.
     Contains digits and uppercase letters only
 
     Args:
-        length (int): length of the generated random string
+        amount (int): amount of strings
+        length (int): length of every string
 
     Returns:
-        str: random string
+        List[str]: random strings
     """
-    return "".join(
-        secrets.choice(string.ascii_uppercase + string.digits) for _ in range(length)
-    )
+    needed = amount * length
+    characters = b""
+    while len(characters) < needed:
+        missing = needed - len(characters)
+        # a few more bytes than missing, as 4 of 256 byte values are rejected
+        random_bytes = os.urandom(missing + missing // 32 + 8)
+        characters += random_bytes.translate(_CHARACTERS, _REJECTED_BYTES)
+    text = characters[:needed].decode("ascii")
+    return [text[start : start + length] for start in range(0, needed, length)]
+
+
+class PseudonymAllocator:
+    """Hands out unique pseudonyms from a pool of pre-generated pseudonyms. Pseudonyms
+    that are pooled, handed out or assigned to a record are never added to the pool"""
+
+    def __init__(
+        self,
+        find_assigned: Optional[Callable[[List[str]], List[Optional[int]]]] = None,
+        pool_size: int = PSEUDONYM_POOL_SIZE,
+        length: int = PSEUDONYM_LENGTH,
+    ):
+        """
+        Args:
+            find_assigned (Optional[Callable[[List[str]], List[Optional[int]]]], optional):
+            returns the record id of every given pseudonym, None for unassigned
+            pseudonyms, e.g. Storage.find_record_ids. Defaults to None, which only
+            prevents duplicates within the pool.
+            pool_size (int, optional): amount of pooled pseudonyms.
+            Defaults to PSEUDONYM_POOL_SIZE.
+            length (int, optional): length of a pseudonym. Defaults to PSEUDONYM_LENGTH.
+        """
+        self.find_assigned = find_assigned
+        self.pool_size = pool_size
+        self.length = length
+        self._pool: Deque[str] = deque()
+        # pooled pseudonyms and handed out ones that were not released yet
+        self._reserved: Set[str] = set()
+        self._lock = threading.Lock()
+        self._refilling = False
+
+    def __len__(self) -> int:
+        return len(self._pool)
+
+    def _generate(self, amount: int) -> List[str]:
+        """Generates pseudonyms and drops the ones that are assigned to a record already
+
+        Args:
+            amount (int): amount of pseudonyms to generate
+
+        Returns:
+            List[str]: unassigned pseudonyms, possibly fewer than amount
+        """
+        candidates = generate_random_strings(amount, self.length)
+        if self.find_assigned is None:
+            return candidates
+        return [
+            pseudonym
+            for pseudonym, record_id in zip(candidates, self.find_assigned(candidates))
+            if record_id is None
+        ]
+
+    def refill(self, minimum: int = 0) -> int:
+        """Fills the pool up to its size, the lock is only held while adding to the
+        pool, so that pseudonyms can be taken during a refill
+
+        Args:
+            minimum (int, optional): amount of pseudonyms the pool needs to contain
+            if it is larger than the pool size. Defaults to 0.
+
+        Returns:
+            int: amount of pooled pseudonyms
+        """
+        target = max(self.pool_size, minimum)
+        while True:
+            with self._lock:
+                missing = target - len(self._pool)
+            if missing <= 0:
+                return len(self._pool)
+            fresh = self._generate(missing)
+            with self._lock:
+                for pseudonym in fresh:
+                    if pseudonym not in self._reserved:
+                        self._reserved.add(pseudonym)
+                        self._pool.append(pseudonym)
+
+    def _refill_in_background(self):
+        """Refills the pool in a thread, unless a background refill is running already"""
+        with self._lock:
+            if self._refilling:
+                return
+            self._refilling = True
+
+        def refill():
+            try:
+                self.refill()
+            finally:
+                self._refilling = False
+
+        threading.Thread(target=refill, daemon=True).start()
+
+    def take(self, amount: int) -> List[str]:
+        """Takes pseudonyms from the pool, the pool is refilled first if it doesn't
+        contain enough pseudonyms and in the background once it is half empty.
+        The pseudonyms need to be released once their records are written
+
+        Args:
+            amount (int): amount of pseudonyms
+
+        Returns:
+            List[str]: unique pseudonyms
+        """
+        taken: List[str] = []
+        while len(taken) < amount:
+            with self._lock:
+                for _ in range(min(amount - len(taken), len(self._pool))):
+                    taken.append(self._pool.popleft())
+            if len(taken) < amount:
+                self.refill(amount - len(taken))
+        if len(self._pool) < self.pool_size // 2:
+            self._refill_in_background()
+        return taken
+
+    def release(self, pseudonyms: List[str]):
+        """Releases taken pseudonyms once their records are written, from then on
+        find_assigned prevents that they are handed out again
+
+        Args:
+            pseudonyms (List[str]): taken pseudonyms
+        """
+        with self._lock:
+            self._reserved.difference_update(pseudonyms)
@@ -0,0 +1,403 @@
+"""Storage of the vault on redis. The packed index entries of a record are a string of
+their own, separate from the hash holding its pseudonym and encrypted record, so that
+searching only reads index data and record bodies are fetched for matches only.
+Complementary keys are strings named by the user id, the ids of all users
+are kept in a set, so that users can be enumerated without scanning.
+Records written before keep their index entries in the record hash, either packed
+or as one 'index:{k}: {n}' field per entry, until migrate_indices.py moves them.
+All record ids are kept in a registry, a sorted set scored by the record id, so that
+records can be enumerated, counted and split into id ranges without scanning.
+A hash maps every pseudonym to the id of its record, for lookups without a search"""
+from itertools import chain
+from typing import Iterator, List, Optional, Tuple
+from redis import Redis
+from redis.client import Pipeline
+from constants import PSEUDONYM_ENTRIES, SEARCH_BATCH_SIZE
+from aliases import IndexGroups
+from indices import group_indices, pack_indices, unpack_indices
+from storage import Storage, StoredRecord
+from util import batched
+
+REGISTRY = f"{PSEUDONYM_ENTRIES}-registry"
+PSEUDONYM_INDEX = f"{PSEUDONYM_ENTRIES}-pseudonyms"
+USERS = f"{PSEUDONYM_ENTRIES}-users"
+RECORD_ID_COUNTER = "hash_name_index"
+PACKED_INDICES_FIELD = "indices"
+
+
+def record_key(record_id: int) -> str:
+    """Returns the name of the hash of a record
+
+    Args:
+        record_id (int): id of the record
+
+    Returns:
+        str: the redis key
+    """
+    return f"{PSEUDONYM_ENTRIES}:{record_id}"
+
+
+def indices_key(record_id: int) -> str:
+    """Returns the name of the string holding the packed index entries of a record
+
+    Args:
+        record_id (int): id of the record
+
+    Returns:
+        str: the redis key
+    """
+    return f"{PSEUDONYM_ENTRIES}-indices:{record_id}"
+
+
+def register(pipe: Pipeline, record_ids: List[int]):
+    """Adds record ids to the registry as part of a pipeline,
+    so that they are registered atomically with their records
+
+    Args:
+        pipe (Pipeline): pipeline that writes the records
+        record_ids (List[int]): ids of the new records
+    """
+    pipe.zadd(REGISTRY, {record_id: record_id for record_id in record_ids})
+
+
+class RedisStorage(Storage):
+    """Stores the vault on a redis server"""
+
+    def __init__(self, database: Redis, binary_database: Redis):
+        """
+        Args:
+            database (Redis): client with decoded responses
+            binary_database (Redis): client with raw responses, used for packed indices
+        """
+        self.database = database
+        self.binary_database = binary_database
+
+    def prepare(self) -> int:
+        """Registers all existing records if the registry is still empty, indexes
+        their pseudonyms if the pseudonym index is still empty and registers all users
+        if the user set is still empty, needed for databases written before the
+        registry, the pseudonym index or the user set existed
+
+        Returns:
+            int: amount of updated records
+        """
+        updated_records = max(self.register_records(), self.index_pseudonyms())
+        self.register_users()
+        return updated_records
+
+    def register_records(self) -> int:
+        """Registers all existing records if the registry is still empty
+
+        Returns:
+            int: amount of newly registered records
+        """
+        if self.record_count() > 0 or not self.database.get(RECORD_ID_COUNTER):
+            return 0
+        scanned_ids = self.scan_record_ids()
+        if scanned_ids:
+            pipe = self.database.pipeline(transaction=False)
+            for id_batch in batched(scanned_ids, SEARCH_BATCH_SIZE):
+                register(pipe, id_batch)
+            pipe.execute()
+        return len(scanned_ids)
+
+    def index_pseudonyms(self, batch_size: int = SEARCH_BATCH_SIZE) -> int:
+        """Adds the pseudonyms of all registered records to the pseudonym index
+        if it is still empty
+
+        Args:
+            batch_size (int, optional): records read per round trip. Defaults to SEARCH_BATCH_SIZE.
+
+        Returns:
+            int: amount of indexed pseudonyms
+        """
+        if self.database.exists(PSEUDONYM_INDEX) or self.record_count() == 0:
+            return 0
+        indexed = 0
+        for id_batch in batched(self.record_ids(batch_size=batch_size), batch_size):
+            pipe = self.database.pipeline(transaction=False)
+            for record_id in id_batch:
+                pipe.hget(record_key(record_id), "pseudonym")
+            pseudonym_ids = {
+                pseudonym: record_id
+                for record_id, pseudonym in zip(id_batch, pipe.execute())
+                if pseudonym is not None
+            }
+            if pseudonym_ids:
+                self.database.hset(PSEUDONYM_INDEX, mapping=pseudonym_ids)
+                indexed += len(pseudonym_ids)
+        return indexed
+
+    def register_users(self) -> int:
+        """Adds all users with a complementary key to the user set if it is still empty
+
+        Returns:
+            int: amount of newly registered users
+        """
+        if self.database.exists(USERS):
+            return 0
+        user_ids = [
+            int(key) for key in self.database.scan_iter(_type="STRING") if key.isdigit()
+        ]
+        if user_ids:
+            self.database.sadd(USERS, *user_ids)
+        return len(user_ids)
+
+    def scan_record_ids(self, batch_size: int = SEARCH_BATCH_SIZE) -> List[int]:
+        """Collects the ids of all records by scanning the database
+
+        Args:
+            batch_size (int, optional): keys returned per SCAN call. Defaults to SEARCH_BATCH_SIZE.
+
+        Returns:
+            List[int]: sorted record ids
+        """
+        scanned_ids = []
+        for key in self.database.scan_iter(
+            match=f"{PSEUDONYM_ENTRIES}:*", count=batch_size, _type="HASH"
+        ):
+            record_id = key.rsplit(":", maxsplit=1)[1]
+            if record_id.isdigit():
+                scanned_ids.append(int(record_id))
+        return sorted(scanned_ids)
+
+    def reserve_ids(self, amount: int) -> int:
+        """Reserves a range of consecutive record ids with a single INCRBY
+
+        Args:
+            amount (int): amount of ids to reserve
+
+        Returns:
+            int: the largest reserved id
+        """
+        return self.database.incrby(RECORD_ID_COUNTER, amount)
+
+    def write_records(self, records: List[StoredRecord]):
+        """Writes the packed indices of every record with one SET and its pseudonym
+        and record with one HSET, the records of a batch are registered and added
+        to the pseudonym index in the same pipelined transaction
+
+        Args:
+            records (List[StoredRecord]): the records to store
+        """
+        for record_batch in batched(records, SEARCH_BATCH_SIZE):
+            pipe = self.database.pipeline(transaction=True)
+            register(pipe, [record_id for record_id, _, _, _ in record_batch])
+            pipe.hset(
+                PSEUDONYM_INDEX,
+                mapping={
+                    pseudonym: record_id for record_id, pseudonym, _, _ in record_batch
+                },
+            )
+            for record_id, pseudonym, record, grouped_indices in record_batch:
+                pipe.set(indices_key(record_id), pack_indices(grouped_indices))
+                pipe.hset(
+                    record_key(record_id),
+                    mapping={"pseudonym": pseudonym, "record": record},
+                )
+            pipe.execute()
+
+    def record_count(self) -> int:
+        """Returns the amount of registered records
+
+        Returns:
+            int: amount of records
+        """
+        return self.database.zcard(REGISTRY)
+
+    def record_ids(
+        self,
+        first_id: Optional[int] = None,
+        last_id: Optional[int] = None,
+        batch_size: int = SEARCH_BATCH_SIZE,
+    ) -> Iterator[int]:
+        """Enumerates the registered record ids within an id range in ascending order,
+        one ZRANGEBYSCORE per batch
+
+        Args:
+            first_id (Optional[int], optional): smallest record id. Defaults to None.
+            last_id (Optional[int], optional): largest record id. Defaults to None.
+            batch_size (int, optional): ids loaded per round trip. Defaults to SEARCH_BATCH_SIZE.
+
+        Yields:
+            Iterator[int]: record ids
+        """
+        minimum = "-inf" if first_id is None else first_id
+        maximum = "+inf" if last_id is None else last_id
+        while True:
+            id_batch = self.database.zrangebyscore(
+                REGISTRY, minimum, maximum, start=0, num=batch_size
+            )
+            for record_id in id_batch:
+                yield int(record_id)
+            if len(id_batch) < batch_size:
+                return
+            minimum = f"({id_batch[-1]}"
+
+    def load_indices(
+        self, record_ids: List[int], batch_size: int = SEARCH_BATCH_SIZE
+    ) -> Iterator[Tuple[int, IndexGroups]]:
+        """Loads and unpacks the indices of the given records with one MGET per batch
+        of records. Records in a former layout are read from their record hash
+        with additional pipelined commands
+
+        Args:
+            record_ids (List[int]): ids of the records to load
+            batch_size (int, optional): records loaded per round trip. Defaults to SEARCH_BATCH_SIZE.
+
+        Yields:
+            Iterator[Tuple[int, IndexGroups]]: record id and its parsed indices,
+            ids without a record are skipped
+        """
+        for id_batch in batched(record_ids, batch_size):
+            packed_indices = self.binary_database.mget(
+                [indices_key(record_id) for record_id in id_batch]
+            )
+            former_ids = [
+                record_id
+                for record_id, packed in zip(id_batch, packed_indices)
+                if packed is None
+            ]
+            former_indices = dict(self.load_former_indices(former_ids))
+            for record_id, packed in zip(id_batch, packed_indices):
+                if packed is not None:
+                    yield record_id, unpack_indices(packed)
+                elif record_id in former_indices:
+                    yield record_id, former_indices[record_id]
+
+    def load_former_indices(
+        self, record_ids: List[int]
+    ) -> Iterator[Tuple[int, IndexGroups]]:
+        """Loads and parses the indices that are still stored in record hashes,
+        packed or with one field per index entry. Records that were migrated in the
+        meantime are read from their packed indices again
+
+        Args:
+            record_ids (List[int]): ids of the records to load
+
+        Yields:
+            Iterator[Tuple[int, IndexGroups]]: record id and its parsed indices,
+            ids without a record are skipped
+        """
+        if not record_ids:
+            return
+        pipe = self.binary_database.pipeline(transaction=False)
+        for record_id in record_ids:
+            pipe.hget(record_key(record_id), PACKED_INDICES_FIELD)
+        field_ids = []
+        for record_id, packed in zip(record_ids, pipe.execute()):
+            if packed is not None:
+                yield record_id, unpack_indices(packed)
+            else:
+                field_ids.append(record_id)
+        if not field_ids:
+            return
+        pipe = self.database.pipeline(transaction=False)
+        for record_id in field_ids:
+            pipe.hgetall(record_key(record_id))
+        migrated_ids = []
+        for record_id, record in zip(field_ids, pipe.execute()):
+            if any(field.startswith("index:") for field in record):
+                yield record_id, group_indices(record)
+            elif record:
+                migrated_ids.append(record_id)
+        if not migrated_ids:
+            return
+        # migrate_indices.py moved the indices after the MGET of load_indices,
+        # it sets the packed indices and deletes the fields in one transaction
+        packed_indices = self.binary_database.mget(
+            [indices_key(record_id) for record_id in migrated_ids]
+        )
+        for record_id, packed in zip(migrated_ids, packed_indices):
+            yield record_id, () if packed is None else unpack_indices(packed)
+
+    def fetch_records(self, record_ids: List[int]) -> List[Tuple[str, str]]:
+        """Loads the encrypted record and pseudonym of the given records
+        with pipelined HMGETs in one round trip, only needed for matching records
+
+        Args:
+            record_ids (List[int]): ids of the records
+
+        Returns:
+            List[Tuple[str, str]]: encrypted record and pseudonym for every id
+        """
+        pipe = self.database.pipeline(transaction=False)
+        for record_id in record_ids:
+            pipe.hmget(record_key(record_id), "record", "pseudonym")
+        return [tuple(match) for match in pipe.execute()]
+
+    def find_record_ids(self, pseudonyms: List[str]) -> List[Optional[int]]:
+        """Looks up the records of the given pseudonyms in the pseudonym index
+        with pipelined HMGETs in one round trip
+
+        Args:
+            pseudonyms (List[str]): pseudonyms of records
+
+        Returns:
+            List[Optional[int]]: record id for every pseudonym, None for unknown pseudonyms
+        """
+        pipe = self.database.pipeline(transaction=False)
+        for pseudonym_batch in batched(pseudonyms, SEARCH_BATCH_SIZE):
+            pipe.hmget(PSEUDONYM_INDEX, pseudonym_batch)
+        return [
+            None if record_id is None else int(record_id)
+            for record_id in chain.from_iterable(pipe.execute())
+        ]
+
+    def get_user_key(self, user_id: int) -> Optional[str]:
+        """Returns the complementary key of a user
+
+        Args:
+            user_id (int): user identifier
+
+        Returns:
+            Optional[str]: the serialized complementary key, None for unknown users
+        """
+        return self.database.get(user_id)
+
+    def set_user_key(self, user_id: int, com_k: str) -> bool:
+        """Stores the complementary key of a user
+
+        Args:
+            user_id (int): user identifier
+            com_k (str): serialized complementary key
+
+        Returns:
+            bool: true if the key was stored
+        """
+        pipe = self.database.pipeline(transaction=True)
+        pipe.set(user_id, com_k)
+        pipe.sadd(USERS, user_id)
+        stored, _ = pipe.execute()
+        return bool(stored)
+
+    def delete_user_key(self, user_id: int) -> bool:
+        """Deletes the complementary key of a user
+
+        Args:
+            user_id (int): user identifier
+
+        Returns:
+            bool: true if the user had a single key that was deleted
+        """
+        pipe = self.database.pipeline(transaction=True)
+        pipe.delete(user_id)
+        pipe.srem(USERS, user_id)
+        deleted, _ = pipe.execute()
+        return deleted == 1
+
+    def user_keys(self) -> Iterator[Tuple[int, str]]:
+        """Enumerates the complementary keys of all users in the user set,
+        the keys are loaded with one MGET per batch of users
+
+        Yields:
+            Iterator[Tuple[int, str]]: user identifier and serialized complementary key
+        """
+        user_ids = [
+            int(user_id)
+            for user_id in self.database.sscan_iter(USERS, count=SEARCH_BATCH_SIZE)
+        ]
+        for id_batch in batched(user_ids, SEARCH_BATCH_SIZE):
+            for user_id, com_k in zip(id_batch, self.database.mget(id_batch)):
+                if com_k is not None:
+                    yield user_id, com_k
@@ -0,0 +1,142 @@
+"""Cache for the record ids matching a search, so that repeating a search
+only checks the records added since it was last executed"""
+import sys
+from array import array
+from typing import Dict, Hashable, Iterator, List, Tuple, Union
+from constants import (
+    SEARCH_BATCH_SIZE,
+    SEARCH_RESULT_CACHE_BYTES,
+    SEARCH_RESULT_CACHE_SIZE,
+)
+from aliases import Search
+from cache import LRUCache
+from matching import iter_matches
+from snapshot import snapshot
+import parallel
+
+# matching record ids, the record id up to which the search was checked
+# and the snapshot generation the result belongs to
+CachedResult = Tuple[array, int, int]
+
+
+def _result_size(key: Hashable, result: CachedResult) -> int:
+    """Estimates the memory used by a cached result in bytes"""
+    _, search_keys, _, _ = key
+    key_bytes = sum(len(search_key) for keys in search_keys for search_key in keys)
+    return sys.getsizeof(result[0]) + key_bytes + 64 * (len(search_keys) + 1)
+
+
+results = LRUCache(SEARCH_RESULT_CACHE_SIZE, SEARCH_RESULT_CACHE_BYTES, _result_size)
+
+
+def result_key(search: Search) -> Hashable:
+    """Identifies the results of a search, the limit doesn't change which records match
+
+    Args:
+        search (Search): a search
+
+    Returns:
+        Hashable: the user, the decryption keys and the type of the search
+    """
+    search_keys, is_fuzzy, expected_amount_of_keywords, _, user_id = search
+    return (
+        user_id,
+        tuple(tuple(keys) for keys in search_keys),
+        is_fuzzy,
+        expected_amount_of_keywords,
+    )
+
+
+def iter_cached_matches(
+    searches: List[Search], batch_size: int = SEARCH_BATCH_SIZE
+) -> Iterator[List[List[int]]]:
+    """Executes searches like iter_matches, but first reports the cached matches
+    of every search and then only checks records added after its cached result.
+    Once all matches were reported, the results of searches without a limit are cached
+
+    Args:
+        searches (List[Search]): the searches to execute
+        batch_size (int, optional): records checked per batch. Defaults to SEARCH_BATCH_SIZE.
+
+    Yields:
+        Iterator[List[List[int]]]: ascending ids of matching records for every search,
+        the cached matches first
+    """
+    generation = snapshot.generation
+    last_id = snapshot.last_record_id()
+    keys = [result_key(search) for search in searches]
+    cached_matches: List[List[int]] = []
+    checked_ids: List[int] = []
+    for key in keys:
+        cached = results.get(key)
+        if cached is None or cached[2] != generation:
+            cached = (array("q"), 0, generation)
+        cached_matches.append(list(cached[0]))
+        checked_ids.append(cached[1])
+
+    # only searches that may find further matches are executed
+    pending = []
+    for search_number, search in enumerate(searches):
+        limit = search[3]
+        if limit is not None:
+            del cached_matches[search_number][limit:]
+            if len(cached_matches[search_number]) == limit:
+                continue
+            search = (
+                search[:3] + (limit - len(cached_matches[search_number]),) + search[4:]
+            )
+        if checked_ids[search_number] < last_id:
+            pending.append((search_number, search))
+    yield cached_matches
+
+    new_matches: List[List[int]] = [[] for _ in searches]
+    if pending:
+        pending_searches = [search for _, search in pending]
+        pending_checked_ids = [
+            checked_ids[search_number] for search_number, _ in pending
+        ]
+        if parallel.is_enabled():
+            match_batches = parallel.iter_matches_parallel(
+                pending_searches, last_id, pending_checked_ids
+            )
+        else:
+            match_batches = iter_matches(
+                pending_searches,
+                batch_size,
+                last_id=last_id,
+                checked_ids=pending_checked_ids,
+            )
+        for match_batch in match_batches:
+            matches: List[List[int]] = [[] for _ in searches]
+            for (search_number, _), batch_matches in zip(pending, match_batch):
+                matches[search_number] = batch_matches
+                new_matches[search_number].extend(batch_matches)
+            yield matches
+
+        for search_number, search in pending:
+            if search[3] is None:
+                record_ids = array("q", cached_matches[search_number])
+                record_ids.extend(new_matches[search_number])
+                results.put(keys[search_number], (record_ids, last_id, generation))
+
+
+def invalidate_user(user_id: int) -> int:
+    """Removes all cached results of a user, needs to be called whenever
+    the user loses access
+
+    Args:
+        user_id (int): user identifier
+
+    Returns:
+        int: the amount of removed results
+    """
+    return results.invalidate(lambda key: key[0] == user_id)
+
+
+def statistics() -> Dict[str, Union[int, float]]:
+    """Returns statistics about the result cache
+
+    Returns:
+        Dict[str, Union[int, float]]: size, hit/miss counters and the hit rate
+    """
+    return results.statistics()
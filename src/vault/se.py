@@ -1,10 +1,14 @@
 """Searchable encryption algorithms"""
-from typing import Any, List
+from itertools import chain
+from typing import Iterator, List, Optional, Tuple
 from fastapi import HTTPException
-from charm.toolbox.symcrypto import SymmetricCryptoAbstraction
-from constants import GROUP
-from hashes import h
-from db import database
+from constants import SEARCH_BATCH_SIZE
+from db import storage
+from keys import get_search_keys, invalidate_user
+from matching import merge_matches
+from aliases import Search
+from metrics import matches_found, timed
+import results
 
 
 def revoke_access(user_id: int) -> bool:
@@ -16,16 +20,146 @@ def revoke_access(user_id: int) -> bool:
     Returns:
         bool: true if the user had a single entry that was removed
     """
-    u_comp_key = database.get(user_id)
+    u_comp_key = storage.get_user_key(user_id)
     if u_comp_key is not None:
-        deleted_rows = database.delete(user_id)
-        return deleted_rows == 1
+        deleted = storage.delete_user_key(user_id)
+        invalidate_user(user_id)
+        results.invalidate_user(user_id)
+        return deleted
     raise HTTPException(
         status_code=400, detail="User has already been revoked or couldn't be found"
     )
 
 
-def search(user_id: int, queries: List[Any]) -> List:
+def fetch_matches(record_ids: List[int]) -> List[Tuple[str, str]]:
+    """Loads the encrypted record and pseudonym of all matching records in one round trip
+
+    Args:
+        record_ids (List[int]): ids of the matching records
+
+    Returns:
+        List[Tuple[str, str]]: encrypted record and pseudonym for every id
+    """
+    return storage.fetch_records(record_ids)
+
+
+def lookup_records(pseudonyms: List[str]) -> List[Optional[str]]:
+    """Finds the encrypted records of the given pseudonyms through the pseudonym index,
+    without checking any index entries
+
+    Args:
+        pseudonyms (List[str]): pseudonyms of records
+
+    Returns:
+        List[Optional[str]]: the encrypted record for every pseudonym,
+        None for unknown pseudonyms
+    """
+    with timed("lookup", "index"):
+        record_ids = storage.find_record_ids(pseudonyms)
+    found_ids = sorted({record_id for record_id in record_ids if record_id is not None})
+    with timed("lookup", "fetch"):
+        records = dict(zip(found_ids, fetch_matches(found_ids)))
+    return [
+        None if record_id is None else records[record_id][0] for record_id in record_ids
+    ]
+
+
+def search_records(
+    searches: List[Search], batch_size: int = SEARCH_BATCH_SIZE
+) -> List[List[Tuple[str, str]]]:
+    """Executes multiple searches in a single pass over all records, on the
+    worker processes if they are enabled. Searches that were executed before
+    only check the records added since then
+
+    Args:
+        searches (List[Search]): the searches to execute
+        batch_size (int, optional): records loaded per round trip for records
+        missing in the snapshot. Defaults to SEARCH_BATCH_SIZE.
+
+    Returns:
+        List[List[Tuple[str, str]]]: encrypted record and pseudonym of all matches
+        for every search
+    """
+    operation = "fuzzy_search" if all(search[1] for search in searches) else "search"
+    with timed(operation, "match"):
+        matches = merge_matches(
+            results.iter_cached_matches(searches, batch_size), len(searches)
+        )
+    record_ids = sorted(set(chain.from_iterable(matches)))
+    with timed(operation, "fetch"):
+        records = dict(zip(record_ids, fetch_matches(record_ids)))
+    matches_found.inc(sum(len(search_matches) for search_matches in matches))
+    return [
+        [records[record_id] for record_id in search_matches]
+        for search_matches in matches
+    ]
+
+
+def stream_search_records(
+    search: Search, batch_size: int = SEARCH_BATCH_SIZE
+) -> Iterator[Tuple[str, str]]:
+    """Executes a search and reports the matches of every batch of records,
+    or of every shard on the worker processes, as soon as they are found
+
+    Args:
+        search (Search): the search to execute
+        batch_size (int, optional): records checked per batch. Defaults to SEARCH_BATCH_SIZE.
+
+    Yields:
+        Iterator[Tuple[str, str]]: encrypted record and pseudonym of a match
+    """
+    for matches in results.iter_cached_matches([search], batch_size):
+        if matches[0]:
+            matches_found.inc(len(matches[0]))
+            yield from fetch_matches(matches[0])
+
+
+def build_search(
+    user_id: int,
+    queries: List[List[str]],
+    is_fuzzy: bool,
+    expected_amount_of_keywords: int = 1,
+    min_matching_keywords: Optional[int] = None,
+    limit: Optional[int] = None,
+) -> Search:
+    """Derives the decryption keys for the queries of a search request
+
+    Args:
+        user_id (int): user identifier
+        queries (List[List[str]]): serialized queries, for an exact search
+        only the first list is used
+        is_fuzzy (bool): if the search is fuzzy
+        expected_amount_of_keywords (int, optional): The amount of keywords to search for
+        in a fuzzy search. Defaults to 1.
+        min_matching_keywords (Optional[int], optional): The amount of keywords that need
+        to match in a fuzzy search. Defaults to None, which requires
+        expected_amount_of_keywords matches.
+        limit (Optional[int], optional): maximum amount of matches, the search stops
+        once it is reached. Defaults to None, which finds all matches.
+
+    Raises:
+        HTTPException: if the user is not authorized to search
+
+    Returns:
+        Search: a search that can be executed by search_records
+    """
+    if is_fuzzy:
+        if min_matching_keywords is None:
+            min_matching_keywords = expected_amount_of_keywords
+        with timed("fuzzy_search", "keys"):
+            search_keys = get_search_keys(user_id, queries)
+        return (search_keys, True, min_matching_keywords, limit, user_id)
+    with timed("search", "keys"):
+        decryption_keys = get_search_keys(user_id, queries[:1])
+    return (decryption_keys, False, len(decryption_keys[0]), limit, user_id)
+
+
+def search(
+    user_id: int,
+    queries: List[List[str]],
+    limit: Optional[int] = None,
+    batch_size: int = SEARCH_BATCH_SIZE,
+) -> List:
     """Searches for records that fit to the given query.
     If a word is equal to a search query is determined through simple equality checks.
     However since this search algorithm is used for searchable encryption the equality is
@@ -34,53 +168,41 @@ def search(user_id: int, queries: List[Any]) -> List:
 
     Args:
         user_id (int): user identifier
-        queries (List[str]): a list of queries
+        queries (List[List[str]]): a list containing a list of serialized queries
+        limit (Optional[int], optional): maximum amount of matches, the search stops
+        once it is reached. Defaults to None, which finds all matches.
+        batch_size (int, optional): records loaded per round trip for records
+        missing in the snapshot. Defaults to SEARCH_BATCH_SIZE.
 
     Returns:
         List: contains all records that equal the search word.
         None if no record was found
     """
-    com_k = database.get(user_id)
-    if com_k is None:
-        raise HTTPException(status_code=403, detail="User is not authorized to search")
-    com_k = GROUP.deserialize(com_k.encode(), compression=False)
-    decryption_keys: List[bytes] = []
-    for query in queries[0]:
-        decryption_keys.append(h(GROUP, GROUP.pair_prod(query, com_k)))
-
-    results = []
-    keys = database.scan_iter(_type="HASH")
-    key: str
-    for key in keys:
-        query_hits = 0
-        for index_key in decryption_keys:
-            aes = SymmetricCryptoAbstraction(index_key)
-            indices = database.hscan_iter(key, "index:*")
-            for _, index in indices:
-                e_index = index.split(sep=",", maxsplit=1)
-                if len(e_index) != 2:
-                    print("The key was not a expected index", e_index)
-                    print("length was", len(e_index))
-                    continue
-                inn: bytes = aes.decrypt(e_index[1])
-                if e_index[0] == inn.decode(errors="replace"):
-                    query_hits += 1
-        if len(queries[0]) == query_hits and query_hits > 0:
-            record = database.hget(key, "record")
-            pseudonym = database.hget(key, "pseudonym")
-            results.append((record, pseudonym))
-    return results
+    exact = build_search(user_id, queries, False, limit=limit)
+    return search_records([exact], batch_size)[0]
 
 
 def fuzzy_search(
-    user_id: int, queries: List[List[Any]], expected_amount_of_keywords: int = 1
+    user_id: int,
+    queries: List[List[str]],
+    expected_amount_of_keywords: int = 1,
+    min_matching_keywords: Optional[int] = None,
+    limit: Optional[int] = None,
+    batch_size: int = SEARCH_BATCH_SIZE,
 ) -> List:
     """Performs fuzzy search for the given queries, equality is based on a wildcard approach
 
     Args:
         user_id (int): user identifier
-        queries (List[List[Any]]): a list for each keyword containing a list of queries
+        queries (List[List[str]]): a list for each keyword containing a list of serialized queries
         expected_amount_of_keywords (int, optional): The amount of keywords to search for. Defaults to 1.
+        min_matching_keywords (Optional[int], optional): The amount of keywords that need
+        to match, each in a different field. Defaults to None, which requires
+        expected_amount_of_keywords matches.
+        limit (Optional[int], optional): maximum amount of matches, the search stops
+        once it is reached. Defaults to None, which finds all matches.
+        batch_size (int, optional): records loaded per round trip for records
+        missing in the snapshot. Defaults to SEARCH_BATCH_SIZE.
 
     Raises:
         HTTPException: if the user is not authorized to search
@@ -88,47 +210,12 @@ def fuzzy_search(
     Returns:
         List: a list of matching records
     """
-    com_k = database.get(user_id)
-    if com_k is None:
-        raise HTTPException(status_code=403, detail="User is not authorized to search")
-    com_k = GROUP.deserialize(com_k.encode(), compression=False)
-    search_tokens = []
-    for q in queries:
-        tmp = []
-        for token in q:
-            tmp.append(h(GROUP, GROUP.pair_prod(token, com_k)))
-        search_tokens.append(tmp)
-
-    results = []
-    keys = database.scan_iter(_type="HASH")
-    key: str
-    for key in keys:
-        query_hits = 0
-        for index_number in range(0, 3):
-            for search_token_keyword_list in search_tokens[:]:
-                indices = database.hscan_iter(key, f"index:{index_number}:*")
-                index: str
-                for _, index in indices:
-                    for search_token in search_token_keyword_list:
-                        aes = SymmetricCryptoAbstraction(search_token)
-                        e_index = index.split(sep=",", maxsplit=1)
-                        if len(e_index) != 2:
-                            print("The key was not a expected index", e_index)
-                            print("length was", len(e_index))
-                            continue
-                        inn: bytes = aes.decrypt(e_index[1])
-                        if e_index[0] == inn.decode(errors="replace"):
-                            query_hits += 1
-                            search_tokens.remove(search_token_keyword_list)
-                            break
-                    else:
-                        continue
-                    break
-                else:
-                    continue
-                break
-        if query_hits == expected_amount_of_keywords and query_hits > 0:
-            record = database.hget(key, "record")
-            pseudonym = database.hget(key, "pseudonym")
-            results.append((record, pseudonym))
-    return results
+    fuzzy = build_search(
+        user_id,
+        queries,
+        True,
+        expected_amount_of_keywords,
+        min_matching_keywords,
+        limit,
+    )
+    return search_records([fuzzy], batch_size)[0]
@@ -0,0 +1,204 @@
+"""Resident snapshot of all parsed index entries in the vault, so that searching
+doesn't need to read index data from the database"""
+import threading
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Iterator, List, Optional, Tuple
+from constants import SEARCH_BATCH_SIZE, SNAPSHOT_MAX_RECORDS
+from db import storage
+from aliases import IndexGroups
+from util import batched
+
+
+class IndexSnapshot:
+    """Keeps the parsed indices of all records in memory.
+    In bounded mode only the first max_records records are kept, the indices of
+    every further record are read from the database whenever they are searched"""
+
+    def __init__(self, max_records: int = 0):
+        """
+        Args:
+            max_records (int, optional): maximum amount of records whose indices are kept.
+            Defaults to 0, which keeps every record.
+        """
+        self.max_records = max_records
+        self.hits = 0
+        self.misses = 0
+        self.loading_progress = (0, 0)
+        # changes whenever records appear below the largest record id,
+        # results up to a record id are only valid within a generation
+        self.generation = 0
+        self._record_ids: List[int] = []
+        self._indices: Dict[int, IndexGroups] = {}
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+
+    def _is_full(self) -> bool:
+        return 0 < self.max_records <= len(self._indices)
+
+    def rebuild(self) -> int:
+        """(Re)loads the snapshot from the database, searches keep using the
+        previous snapshot until loading is done. The lock is only held to swap in
+        the loaded snapshot, records added meanwhile are carried over
+
+        Returns:
+            int: the amount of records in the snapshot
+        """
+        with self._rebuild_lock:
+            storage.prepare()
+            record_ids = list(storage.record_ids())
+            cached_ids = record_ids
+            if self.max_records > 0:
+                cached_ids = record_ids[: self.max_records]
+            indices = {}
+            self.loading_progress = (0, len(cached_ids))
+            for record_id, record_indices in storage.load_indices(cached_ids):
+                indices[record_id] = record_indices
+                self.loading_progress = (len(indices), len(cached_ids))
+            with self._lock:
+                loaded_ids = set(record_ids)
+                for record_id in self._record_ids:
+                    if record_id not in loaded_ids:
+                        insort(record_ids, record_id)
+                        if record_id in self._indices and not (
+                            0 < self.max_records <= len(indices)
+                        ):
+                            indices[record_id] = self._indices[record_id]
+                self._indices = indices
+                self._record_ids = record_ids
+                self.generation += 1
+                self.hits = 0
+                self.misses = 0
+                return len(record_ids)
+
+    def add(self, record_id: int, indices: IndexGroups):
+        """Adds a newly written record to the snapshot
+
+        Args:
+            record_id (int): id of the record
+            indices (IndexGroups): parsed indices of the record
+        """
+        with self._lock:
+            if not self._is_full():
+                self._indices[record_id] = indices
+            if self._record_ids and record_id <= self._record_ids[-1]:
+                position = bisect_left(self._record_ids, record_id)
+                if self._record_ids[position] == record_id:
+                    # already loaded by a rebuild that ran after the write
+                    return
+                # concurrent writers may finish out of order
+                self._record_ids.insert(position, record_id)
+                self.generation += 1
+            else:
+                self._record_ids.append(record_id)
+
+    def sync(self, last_record_id: int, generation: Optional[int] = None) -> int:
+        """Loads all records up to the given id that were added by another process.
+        Once the generation of the other process changed, records may have appeared
+        below the largest known id, so all record ids are compared
+
+        Args:
+            last_record_id (int): largest record id known to the other process
+            generation (Optional[int], optional): snapshot generation of the other
+            process. Defaults to None, which only loads records above the largest id.
+
+        Returns:
+            int: the amount of loaded records
+        """
+        with self._lock:
+            if generation is None or generation == self.generation:
+                first_id = self._record_ids[-1] + 1 if self._record_ids else 1
+                new_ids = list(storage.record_ids(first_id, last_record_id))
+            else:
+                known_ids = set(self._record_ids)
+                new_ids = [
+                    record_id
+                    for record_id in storage.record_ids(last_id=last_record_id)
+                    if record_id not in known_ids
+                ]
+                self.generation = generation
+            loaded_records = 0
+            for record_id, indices in storage.load_indices(new_ids):
+                if not self._is_full():
+                    self._indices[record_id] = indices
+                if self._record_ids and record_id < self._record_ids[-1]:
+                    insort(self._record_ids, record_id)
+                else:
+                    self._record_ids.append(record_id)
+                loaded_records += 1
+            return loaded_records
+
+    def record_ids(self) -> List[int]:
+        """Returns the ids of all records
+
+        Returns:
+            List[int]: ascending record ids
+        """
+        return self._record_ids[:]
+
+    def last_record_id(self) -> int:
+        """Returns the largest record id
+
+        Returns:
+            int: the largest record id, 0 if there are no records
+        """
+        record_ids = self._record_ids
+        return record_ids[-1] if record_ids else 0
+
+    def records(
+        self,
+        batch_size: int = SEARCH_BATCH_SIZE,
+        first_id: Optional[int] = None,
+        last_id: Optional[int] = None,
+    ) -> Iterator[Tuple[int, IndexGroups]]:
+        """Iterates over the indices of all records, or the records within an id range,
+        in ascending order of their ids.
+        Records that are not part of the snapshot are loaded in batches from the database
+
+        Args:
+            batch_size (int, optional): records loaded per round trip on a miss.
+            Defaults to SEARCH_BATCH_SIZE.
+            first_id (Optional[int], optional): smallest record id. Defaults to None.
+            last_id (Optional[int], optional): largest record id. Defaults to None.
+
+        Yields:
+            Iterator[Tuple[int, IndexGroups]]: record id and its parsed indices
+        """
+        record_ids = self._record_ids[:]
+        start = 0 if first_id is None else bisect_left(record_ids, first_id)
+        end = len(record_ids) if last_id is None else bisect_right(record_ids, last_id)
+        record_ids = record_ids[start:end]
+        indices = self._indices
+        for id_batch in batched(record_ids, batch_size):
+            missing_ids = [
+                record_id for record_id in id_batch if record_id not in indices
+            ]
+            loaded_indices = dict(storage.load_indices(missing_ids, batch_size))
+            with self._lock:
+                self.hits += len(id_batch) - len(missing_ids)
+                self.misses += len(missing_ids)
+            for record_id in id_batch:
+                if record_id in indices:
+                    yield record_id, indices[record_id]
+                elif record_id in loaded_indices:
+                    yield record_id, loaded_indices[record_id]
+
+    def statistics(self) -> Dict[str, int]:
+        """Returns statistics about the snapshot
+
+        Returns:
+            Dict[str, int]: amount of records, cached records, hits, misses
+            and the progress of the last (re)load
+        """
+        loaded_records, records_to_load = self.loading_progress
+        return {
+            "records": len(self._record_ids),
+            "loadedRecords": loaded_records,
+            "recordsToLoad": records_to_load,
+            "cachedRecords": len(self._indices),
+            "maxRecords": self.max_records,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+snapshot = IndexSnapshot(SNAPSHOT_MAX_RECORDS)
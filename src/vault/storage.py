@@ -0,0 +1,149 @@
+"""Storage interface of the vault. Records, their index entries and the complementary
+keys of users are only accessed through a Storage, so that the vault can run on
+redis or on the embedded local storage"""
+from abc import ABC, abstractmethod
+from typing import Iterator, List, Optional, Tuple
+from constants import SEARCH_BATCH_SIZE
+from aliases import IndexGroups
+
+# record id, pseudonym, encrypted record and the parsed index entries
+StoredRecord = Tuple[int, str, str, IndexGroups]
+
+
+class Storage(ABC):
+    """Persistence of records and complementary keys"""
+
+    @abstractmethod
+    def prepare(self) -> int:
+        """Brings data written by older vault versions or other processes up to date,
+        called before the index snapshot is loaded
+
+        Returns:
+            int: the amount of updated records
+        """
+
+    @abstractmethod
+    def reserve_ids(self, amount: int) -> int:
+        """Reserves a range of consecutive record ids
+
+        Args:
+            amount (int): amount of ids to reserve
+
+        Returns:
+            int: the largest reserved id
+        """
+
+    @abstractmethod
+    def write_records(self, records: List[StoredRecord]):
+        """Stores records with reserved ids, every record becomes visible
+        to record_ids together with its index entries and its pseudonym
+
+        Args:
+            records (List[StoredRecord]): the records to store
+        """
+
+    @abstractmethod
+    def record_count(self) -> int:
+        """Returns the amount of stored records
+
+        Returns:
+            int: amount of records
+        """
+
+    @abstractmethod
+    def record_ids(
+        self,
+        first_id: Optional[int] = None,
+        last_id: Optional[int] = None,
+        batch_size: int = SEARCH_BATCH_SIZE,
+    ) -> Iterator[int]:
+        """Enumerates the stored record ids within an id range in ascending order
+
+        Args:
+            first_id (Optional[int], optional): smallest record id. Defaults to None.
+            last_id (Optional[int], optional): largest record id. Defaults to None.
+            batch_size (int, optional): ids loaded at once. Defaults to SEARCH_BATCH_SIZE.
+
+        Yields:
+            Iterator[int]: record ids
+        """
+
+    @abstractmethod
+    def load_indices(
+        self, record_ids: List[int], batch_size: int = SEARCH_BATCH_SIZE
+    ) -> Iterator[Tuple[int, IndexGroups]]:
+        """Loads and parses the index entries of the given records
+
+        Args:
+            record_ids (List[int]): ids of the records to load
+            batch_size (int, optional): records loaded at once. Defaults to SEARCH_BATCH_SIZE.
+
+        Yields:
+            Iterator[Tuple[int, IndexGroups]]: record id and its parsed indices,
+            ids without a record are skipped
+        """
+
+    @abstractmethod
+    def fetch_records(self, record_ids: List[int]) -> List[Tuple[str, str]]:
+        """Loads the encrypted record and pseudonym of the given records at once
+
+        Args:
+            record_ids (List[int]): ids of the records
+
+        Returns:
+            List[Tuple[str, str]]: encrypted record and pseudonym for every id
+        """
+
+    @abstractmethod
+    def find_record_ids(self, pseudonyms: List[str]) -> List[Optional[int]]:
+        """Looks up the records of the given pseudonyms without searching their indices,
+        every record is added to the pseudonym index together with the record itself
+
+        Args:
+            pseudonyms (List[str]): pseudonyms of records
+
+        Returns:
+            List[Optional[int]]: record id for every pseudonym, None for unknown pseudonyms
+        """
+
+    @abstractmethod
+    def get_user_key(self, user_id: int) -> Optional[str]:
+        """Returns the complementary key of a user
+
+        Args:
+            user_id (int): user identifier
+
+        Returns:
+            Optional[str]: the serialized complementary key, None for unknown users
+        """
+
+    @abstractmethod
+    def set_user_key(self, user_id: int, com_k: str) -> bool:
+        """Stores the complementary key of a user
+
+        Args:
+            user_id (int): user identifier
+            com_k (str): serialized complementary key
+
+        Returns:
+            bool: true if the key was stored
+        """
+
+    @abstractmethod
+    def delete_user_key(self, user_id: int) -> bool:
+        """Deletes the complementary key of a user
+
+        Args:
+            user_id (int): user identifier
+
+        Returns:
+            bool: true if the user had a key that was deleted
+        """
+
+    @abstractmethod
+    def user_keys(self) -> Iterator[Tuple[int, str]]:
+        """Enumerates the complementary keys of all users
+
+        Yields:
+            Iterator[Tuple[int, str]]: user identifier and serialized complementary key
+        """
@@ -0,0 +1,20 @@
+"""Utility functions"""
+from itertools import islice
+from typing import Iterable, Iterator, List
+
+
+def batched(iterable: Iterable, batch_size: int) -> Iterator[List]:
+    """Splits an iterable into lists of at most batch_size elements
+
+    Args:
+        iterable (Iterable): iterable to split
+        batch_size (int): maximum size of a batch
+
+    Yields:
+        Iterator[List]: consecutive batches
+    """
+    iterator = iter(iterable)
+    batch = list(islice(iterator, batch_size))
+    while batch:
+        yield batch
+        batch = list(islice(iterator, batch_size))
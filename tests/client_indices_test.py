@@ -0,0 +1,36 @@
+import pytest
+import requests
+
+FORMATS_URL = "http://localhost:8000/indexFormats"
+
+
+@pytest.fixture(name="indices")
+def fixture_indices(client_backend):
+    indices = client_backend("indices")
+    indices._negotiated_format = None  # pylint: disable=protected-access
+    return indices
+
+
+def test_negotiation_is_kept(indices, requests_mock):
+    requests_mock.get(FORMATS_URL, json=[1, 2])
+    assert indices.negotiate_index_format() == indices.TAG_INDEX_FORMAT
+    assert indices.negotiate_index_format() == indices.TAG_INDEX_FORMAT
+    assert requests_mock.call_count == 1
+
+
+def test_vault_without_negotiation_uses_the_legacy_format(indices, requests_mock):
+    requests_mock.get(FORMATS_URL, status_code=404)
+    assert indices.negotiate_index_format() == indices.LEGACY_INDEX_FORMAT
+    assert indices.negotiate_index_format() == indices.LEGACY_INDEX_FORMAT
+    assert requests_mock.call_count == 1
+
+
+@pytest.mark.parametrize(
+    "failure", [{"exc": requests.ConnectionError}, {"status_code": 503}]
+)
+def test_negotiation_is_retried_after_failures(indices, requests_mock, failure):
+    requests_mock.get(FORMATS_URL, [failure, {"json": [1, 2]}])
+    assert indices.negotiate_index_format() == indices.LEGACY_INDEX_FORMAT
+    assert indices.negotiate_index_format() == indices.TAG_INDEX_FORMAT
+    assert indices.negotiate_index_format() == indices.TAG_INDEX_FORMAT
+    assert requests_mock.call_count == 2
@@ -0,0 +1,47 @@
+import importlib
+import os
+import sys
+import tempfile
+import urllib.parse
+import pytest
+
+SOURCE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "src")
+sys.path.append(os.path.join(SOURCE, "vault"))
+# the vault modules create their storage on import, tests run on the local storage
+os.environ.setdefault("STORAGE_BACKEND", "local")
+os.environ.setdefault("STORAGE_PATH", tempfile.mkdtemp(prefix="vault-test-"))
+
+# the redis storage is tested on a database of its own, which is flushed
+TEST_DB = 15
+
+
+@pytest.fixture(name="redis_storage")
+def fixture_redis_storage():
+    import redis
+    from constants import API_DB
+    from redis_storage import RedisStorage
+
+    db = urllib.parse.urlsplit(API_DB or "http://localhost:6379")
+    database = redis.Redis(db.hostname, db.port, TEST_DB, decode_responses=True)
+    try:
+        database.ping()
+    except redis.exceptions.ConnectionError:
+        pytest.skip("no redis server")
+    database.flushdb()
+    yield RedisStorage(database, redis.Redis(db.hostname, db.port, TEST_DB))
+    database.flushdb()
+
+
+@pytest.fixture(name="client_backend")
+def fixture_client_backend():
+    """Imports modules of the client backend, whose module names overlap with the
+    vault modules, the modules of the vault are restored afterwards"""
+    modules = dict(sys.modules)
+    path = sys.path[:]
+    sys.path.insert(0, os.path.join(SOURCE, "clients", "backend"))
+    for name in os.listdir(os.path.join(SOURCE, "vault")):
+        sys.modules.pop(name[:-3], None)
+    yield importlib.import_module
+    sys.path[:] = path
+    sys.modules.clear()
+    sys.modules.update(modules)
@@ -0,0 +1,75 @@
+import json
+from base64 import b64encode
+import pytest
+from constants import LEGACY_INDEX_FORMAT, TAG_INDEX_FORMAT
+from indices import (
+    PACKED_INDICES_VERSION,
+    pack_indices,
+    parse_index,
+    parse_indices,
+    unpack_indices,
+)
+
+IV = bytes(range(16))
+CIPHER_TEXT = b"ciphertext of the random"
+NONCE = bytes(range(100, 116))
+TAG = bytes(range(200, 216))
+
+
+def legacy_index(random: str = "R" * 16) -> str:
+    cipher_text = {
+        "ALG": 0,
+        "MODE": 2,
+        "IV": b64encode(IV).decode(),
+        "CipherText": b64encode(CIPHER_TEXT).decode(),
+    }
+    return f"{random},{json.dumps(cipher_text)}"
+
+
+def tag_index(nonce: bytes = NONCE) -> str:
+    return f"v{TAG_INDEX_FORMAT}:{b64encode(nonce).decode()},{b64encode(TAG).decode()}"
+
+
+def test_parse_index():
+    assert parse_index(legacy_index()) == (
+        LEGACY_INDEX_FORMAT,
+        b"R" * 16,
+        IV + CIPHER_TEXT,
+    )
+    assert parse_index(tag_index()) == (TAG_INDEX_FORMAT, NONCE, TAG)
+    assert parse_index("no separator") is None
+
+
+@pytest.mark.parametrize(
+    "grouped_indices",
+    [
+        (),
+        ((),),
+        ((parse_index(legacy_index()),),),
+        ((parse_index(tag_index()),),),
+        (
+            (parse_index(legacy_index("A" * 16)), parse_index(tag_index())),
+            (),
+            (parse_index(tag_index(b"short")), parse_index(legacy_index("B" * 16))),
+        ),
+    ],
+)
+def test_packed_indices_round_trip(grouped_indices):
+    packed = pack_indices(grouped_indices)
+    assert packed[0] == PACKED_INDICES_VERSION
+    assert unpack_indices(packed) == grouped_indices
+
+
+def test_packed_indices_round_trip_of_an_add_request():
+    indices = [
+        [legacy_index().split(",", 1), tag_index().split(",", 1)],
+        [tag_index(bytes(32)).split(",", 1)],
+    ]
+    grouped_indices = parse_indices(indices)
+    assert unpack_indices(pack_indices(grouped_indices)) == grouped_indices
+
+
+def test_unpack_rejects_unknown_versions():
+    packed = pack_indices(((parse_index(tag_index()),),))
+    with pytest.raises(ValueError):
+        unpack_indices(bytes((PACKED_INDICES_VERSION + 1,)) + packed[1:])
@@ -0,0 +1,62 @@
+import pytest
+from fastapi import HTTPException
+import keys
+from local_storage import LocalStorage
+
+USER_ID = 1
+COM_K = "complementary key"
+
+
+@pytest.fixture(name="storage")
+def fixture_storage(tmp_path, monkeypatch):
+    storage = LocalStorage(str(tmp_path))
+    storage.set_user_key(USER_ID, COM_K)
+    monkeypatch.setattr(keys, "storage", storage)
+    keys.complementary_keys.clear()
+    keys.search_keys.clear()
+    return storage
+
+
+def revoke(storage):
+    storage.delete_user_key(USER_ID)
+    keys.invalidate_user(USER_ID)
+
+
+def test_complementary_key_of_user_revoked_during_lookup_is_not_cached(
+    storage, monkeypatch
+):
+    get_user_key = storage.get_user_key
+
+    def get_user_key_and_revoke(user_id):
+        com_k = get_user_key(user_id)
+        revoke(storage)
+        return com_k
+
+    monkeypatch.setattr(storage, "get_user_key", get_user_key_and_revoke)
+    assert keys.get_complementary_key(USER_ID) is not None
+    assert keys.complementary_keys.get(USER_ID) is None
+    monkeypatch.setattr(storage, "get_user_key", get_user_key)
+    assert keys.get_complementary_key(USER_ID) is None
+
+
+def test_search_key_of_user_revoked_during_lookup_is_not_cached(storage, monkeypatch):
+    def h_and_revoke(group, group_element):
+        revoke(storage)
+        return b"search key"
+
+    monkeypatch.setattr(keys, "h", h_and_revoke)
+    assert keys.get_search_keys(USER_ID, [["query"]]) == [[b"search key"]]
+    assert keys.search_keys.get((USER_ID, "query")) is None
+    with pytest.raises(HTTPException) as error:
+        keys.get_search_keys(USER_ID, [["query"]])
+    assert error.value.status_code == 403
+
+
+def test_cached_search_keys_are_denied_after_revoking(storage, monkeypatch):
+    monkeypatch.setattr(keys, "h", lambda group, group_element: b"search key")
+    assert keys.get_search_keys(USER_ID, [["query"]]) == [[b"search key"]]
+    assert keys.search_keys.get((USER_ID, "query")) == b"search key"
+    revoke(storage)
+    with pytest.raises(HTTPException) as error:
+        keys.get_search_keys(USER_ID, [["query"]])
+    assert error.value.status_code == 403
@@ -0,0 +1,58 @@
+from constants import TAG_INDEX_FORMAT
+from hashes import index_tag
+from matching import fuzzy_matcher, max_assigned_keywords
+
+
+def index(keyword: str) -> tuple:
+    nonce = b"nonce of " + keyword.encode()
+    return (TAG_INDEX_FORMAT, nonce, index_tag(key(keyword), nonce))
+
+
+def key(keyword: str) -> bytes:
+    return keyword.encode().ljust(16, b"_")
+
+
+def record(*fields: list) -> tuple:
+    return tuple(tuple(index(keyword) for keyword in field) for field in fields)
+
+
+def test_max_assigned_keywords():
+    assert max_assigned_keywords([]) == 0
+    assert max_assigned_keywords([[], []]) == 0
+    assert max_assigned_keywords([[0], [0]]) == 1
+    # the first keyword moves to field 1 so that the second one gets field 0
+    assert max_assigned_keywords([[0, 1], [0]]) == 2
+    assert max_assigned_keywords([[0, 1, 2], [0], [0, 1], [3]]) == 4
+
+
+def test_fuzzy_matcher_with_more_than_three_fields():
+    matches = fuzzy_matcher([[key("a")], [key("b")], [key("c")], [key("d")]], 4)
+    assert matches(record(["x"], ["d"], ["c"], ["b"], ["a"]))
+    assert not matches(record(["x"], ["d"], ["c"], ["b"], ["y"]))
+
+
+def test_fuzzy_matcher_counts_a_field_once():
+    matches = fuzzy_matcher([[key("a")], [key("b")]], 2)
+    # both keywords only match the same field
+    assert not matches(record(["a", "b"], ["x"]))
+    assert matches(record(["a", "b"], ["b"]))
+
+
+def test_fuzzy_matcher_with_fewer_required_than_keywords():
+    matches = fuzzy_matcher([[key("a")], [key("b")], [key("c")]], 2)
+    assert matches(record(["a"], ["x"], ["c"]))
+    assert not matches(record(["a"], ["x"], ["y"]))
+
+
+def test_fuzzy_matcher_with_more_required_than_keywords():
+    matches = fuzzy_matcher([[key("a")], [key("b")]], 3)
+    assert not matches(record(["a"], ["b"], ["c"]))
+
+
+def test_fuzzy_matcher_with_empty_groups():
+    matches = fuzzy_matcher([[key("a")], [key("b")]], 2)
+    assert not matches(())
+    assert not matches(record([], []))
+    assert matches(record([], ["b"], [], ["a"]))
+    assert not fuzzy_matcher([], 1)(record(["a"]))
+    assert not fuzzy_matcher([[key("a")]], 0)(record(["a"]))
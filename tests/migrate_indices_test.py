@@ -0,0 +1,91 @@
+import migrate_indices
+from indices import pack_indices, parse_index
+from redis_storage import PACKED_INDICES_FIELD, indices_key, record_key
+from tests.indices_test import legacy_index, tag_index
+
+FIELD_INDICES = (
+    (parse_index(legacy_index("A" * 16)), parse_index(tag_index())),
+    (parse_index(legacy_index("B" * 16)),),
+)
+PACKED_INDICES = ((parse_index(tag_index(b"packed nonce")),),)
+CURRENT_INDICES = ((parse_index(tag_index(b"current nonce")),),)
+
+
+def write_former_records(storage):
+    """Writes a record with one field per index entry, one with a packed field
+    in its hash and one in the current layout"""
+    database = storage.database
+    database.hset(
+        record_key(1),
+        mapping={
+            "pseudonym": "P1",
+            "record": "record 1",
+            "index:0: 0": legacy_index("A" * 16),
+            "index:0: 1": tag_index(),
+            "index:1: 0": legacy_index("B" * 16),
+        },
+    )
+    storage.binary_database.hset(
+        record_key(2),
+        mapping={
+            "pseudonym": "P2",
+            "record": "record 2",
+            PACKED_INDICES_FIELD: pack_indices(PACKED_INDICES),
+        },
+    )
+    storage.reserve_ids(2)
+    # registers the records written before the registry existed
+    storage.prepare()
+    storage.reserve_ids(1)
+    storage.write_records([(3, "P3", "record 3", CURRENT_INDICES)])
+
+
+def test_migration_moves_indices_out_of_record_hashes(redis_storage, monkeypatch):
+    monkeypatch.setattr(migrate_indices, "storage", redis_storage)
+    write_former_records(redis_storage)
+    expected_indices = [(1, FIELD_INDICES), (2, PACKED_INDICES), (3, CURRENT_INDICES)]
+    assert list(redis_storage.load_indices([1, 2, 3])) == expected_indices
+
+    converted, _, _ = migrate_indices.migrate(batch_size=2)
+    assert converted == 2
+    database = redis_storage.database
+    for record_id in (1, 2):
+        assert database.exists(indices_key(record_id))
+        assert database.hgetall(record_key(record_id)) == {
+            "pseudonym": f"P{record_id}",
+            "record": f"record {record_id}",
+        }
+    assert list(redis_storage.load_indices([1, 2, 3])) == expected_indices
+    assert redis_storage.fetch_records([1, 2]) == [
+        ("record 1", "P1"),
+        ("record 2", "P2"),
+    ]
+
+
+def test_migration_skips_converted_records(redis_storage, monkeypatch):
+    monkeypatch.setattr(migrate_indices, "storage", redis_storage)
+    write_former_records(redis_storage)
+    assert migrate_indices.migrate()[0] == 2
+    assert migrate_indices.migrate() == (0, 0, 0)
+
+
+def test_records_migrated_while_loading_keep_their_indices(redis_storage, monkeypatch):
+    monkeypatch.setattr(migrate_indices, "storage", redis_storage)
+    write_former_records(redis_storage)
+    mget = redis_storage.binary_database.mget
+    migrations = []
+
+    def mget_and_migrate(keys):
+        values = mget(keys)
+        if not migrations:
+            # the records are migrated after the packed indices were read
+            migrations.append(migrate_indices.migrate())
+        return values
+
+    monkeypatch.setattr(redis_storage.binary_database, "mget", mget_and_migrate)
+    assert list(redis_storage.load_indices([1, 2, 3])) == [
+        (1, FIELD_INDICES),
+        (2, PACKED_INDICES),
+        (3, CURRENT_INDICES),
+    ]
+    assert migrations[0][0] == 2
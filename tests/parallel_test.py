@@ -0,0 +1,69 @@
+import threading
+import matching
+import parallel
+import snapshot as snapshot_module
+from constants import TAG_INDEX_FORMAT
+from hashes import index_tag
+from local_storage import LocalStorage
+from snapshot import IndexSnapshot
+
+KEY = b"k" * 16
+AMOUNT_OF_RECORDS = 200
+SEARCH = ([[KEY]], False, 1, None, 1)
+
+
+def indices(record_id: int) -> tuple:
+    nonce = str(record_id).encode()
+    # every second record matches the search
+    key = KEY if record_id % 2 else b"o" * 16
+    return (((TAG_INDEX_FORMAT, nonce, index_tag(key, nonce)),),)
+
+
+def test_searches_keep_running_while_the_workers_restart(tmp_path, monkeypatch):
+    storage = LocalStorage(str(tmp_path))
+    storage.reserve_ids(AMOUNT_OF_RECORDS)
+    storage.write_records(
+        [
+            (record_id, f"P{record_id}", "record", indices(record_id))
+            for record_id in range(1, AMOUNT_OF_RECORDS + 1)
+        ]
+    )
+    snapshot = IndexSnapshot()
+    monkeypatch.setattr(snapshot_module, "storage", storage)
+    monkeypatch.setattr(parallel, "snapshot", snapshot)
+    monkeypatch.setattr(matching, "snapshot", snapshot)
+    snapshot.rebuild()
+    expected_matches = list(range(1, AMOUNT_OF_RECORDS + 1, 2))
+
+    parallel.start_workers(2)
+    errors = []
+    results = []
+    restarting = threading.Event()
+
+    def search():
+        try:
+            while not restarting.is_set() or len(results) < 5:
+                results.append(
+                    matching.merge_matches(parallel.iter_matches_parallel([SEARCH]), 1)
+                )
+        except Exception as error:  # pylint: disable=broad-except
+            errors.append(error)
+
+    searching = [threading.Thread(target=search) for _ in range(4)]
+    try:
+        for thread in searching:
+            thread.start()
+        for _ in range(3):
+            snapshot.rebuild()
+            parallel.restart_workers(2)
+        restarting.set()
+        parallel.stop_workers()
+        for thread in searching:
+            thread.join(30)
+    finally:
+        restarting.set()
+        parallel.stop_workers()
+    assert not errors
+    assert results
+    assert all(matches == [expected_matches] for matches in results)
+    assert not parallel.is_enabled()
@@ -0,0 +1,101 @@
+"""Compares the former three-field fuzzy matcher with the generalized fuzzy engine
+of the vault for several field counts and name lengths. Runs in memory, no database needed"""
+import os, sys, random, string, time
+from hashlib import sha256
+
+TESTS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(TESTS)
+sys.path.append(os.path.join(os.path.dirname(TESTS), "src", "vault"))
+
+from charm.toolbox.symcrypto import SymmetricCryptoAbstraction
+from template_system import generate_wildcard_list
+from indices import SearchToken, is_match, parse_index
+from matching import fuzzy_matcher
+
+SECRET = os.urandom(16)
+AMOUNT_OF_RECORDS = 50
+FIELD_COUNTS = [3, 5, 8]
+NAME_LENGTHS = [6, 10, 16]
+
+
+def derive_key(word: str) -> bytes:
+    """Stands in for h(e(hs(word)^xu, com_k)), equal words get equal keys"""
+    return sha256(SECRET + word.encode()).digest()
+
+
+def random_name(length: int) -> str:
+    return "".join(random.choices(string.ascii_uppercase, k=length))
+
+
+def create_record(names):
+    grouped_indices = []
+    for wildcard_list in generate_wildcard_list(names):
+        indices = []
+        for wildcard in wildcard_list:
+            nonce = "".join(
+                random.choices(string.ascii_uppercase + string.digits, k=16)
+            )
+            encrypted_nonce = SymmetricCryptoAbstraction(derive_key(wildcard)).encrypt(
+                nonce
+            )
+            indices.append(parse_index(f"{nonce},{encrypted_nonce}"))
+        grouped_indices.append(tuple(indices))
+    return tuple(grouped_indices)
+
+
+def former_fuzzy_matcher(search_keys, expected_amount_of_keywords):
+    """Fuzzy matching as it was implemented before, only checks the first three fields"""
+    search_tokens = [[SearchToken(key) for key in keys] for keys in search_keys]
+
+    def matches(grouped_indices):
+        remaining_tokens = search_tokens[:]
+        query_hits = 0
+        for indices in grouped_indices[:3]:
+            for search_token_keyword_list in remaining_tokens[:]:
+                for index in indices:
+                    for token in search_token_keyword_list:
+                        if is_match(token, index):
+                            query_hits += 1
+                            remaining_tokens.remove(search_token_keyword_list)
+                            break
+                    else:
+                        continue
+                    break
+                else:
+                    continue
+                break
+        return query_hits == expected_amount_of_keywords and query_hits > 0
+
+    return matches
+
+
+def measure(matcher, records):
+    start = time.perf_counter()
+    hits = sum(1 for record in records if matcher(record))
+    return time.perf_counter() - start, hits
+
+
+print("fields  length  former[s]  former hits  engine[s]  engine hits")
+for field_count in FIELD_COUNTS:
+    for name_length in NAME_LENGTHS:
+        names = [random_name(name_length) for _ in range(field_count)]
+        records = [create_record(names)] + [
+            create_record([random_name(name_length) for _ in range(field_count)])
+            for _ in range(AMOUNT_OF_RECORDS - 1)
+        ]
+        # search with a typo in the first name
+        query_names = [names[0][:-1] + "X"] + names[1:]
+        search_keys = [
+            [derive_key(wildcard) for wildcard in wildcard_list]
+            for wildcard_list in generate_wildcard_list(query_names)
+        ]
+        former_time, former_hits = measure(
+            former_fuzzy_matcher(search_keys, field_count), records
+        )
+        engine_time, engine_hits = measure(
+            fuzzy_matcher(search_keys, field_count), records
+        )
+        print(
+            f"{field_count:6}  {name_length:6}  {former_time:9.3f}  {former_hits:11}"
+            f"  {engine_time:9.3f}  {engine_hits:11}"
+        )
@@ -0,0 +1,87 @@
+"""Compares the redis memory usage and the parsing time of index entries stored as one
+'index:{k}: {n}' field per entry with the packed layout of a single value per record.
+The memory usage is measured with MEMORY USAGE on the records written to the
+database at API_DB, they are deleted afterwards"""
+import os, sys, random, string, time
+from base64 import b64encode
+
+TESTS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(TESTS)
+sys.path.append(os.path.join(os.path.dirname(TESTS), "src", "vault"))
+
+from charm.toolbox.symcrypto import SymmetricCryptoAbstraction
+from template_system import generate_wildcard_list
+from constants import LEGACY_INDEX_FORMAT, PSEUDONYM_ENTRIES, TAG_INDEX_FORMAT
+from db import storage
+from hashes import index_tag
+from indices import group_indices, pack_indices, unpack_indices
+
+AMOUNT_OF_RECORDS = 1000
+NAMES = ["JOHANNES", "MUELLER", "BERLIN"]
+PREFIX = f"{PSEUDONYM_ENTRIES}-index-encoding"
+
+database = storage.binary_database
+
+
+def memory_usage(records: list) -> int:
+    """Writes the records, measures their exact memory usage and deletes them"""
+    keys = [f"{PREFIX}:{record_number}" for record_number in range(len(records))]
+    pipe = database.pipeline(transaction=False)
+    for key, record in zip(keys, records):
+        if isinstance(record, dict):
+            pipe.hset(key, mapping=record)
+        else:
+            pipe.set(key, record)
+    pipe.execute()
+    for key in keys:
+        pipe.memory_usage(key, samples=0)
+    usage = sum(pipe.execute())
+    database.delete(*keys)
+    return usage
+
+
+def create_entry(index_format: int) -> str:
+    key = os.urandom(32)
+    if index_format == TAG_INDEX_FORMAT:
+        nonce = os.urandom(8)
+        return (
+            f"v{TAG_INDEX_FORMAT}:{b64encode(nonce).decode()},"
+            + b64encode(index_tag(key, nonce)).decode()
+        )
+    nonce = "".join(random.choices(string.ascii_uppercase + string.digits, k=16))
+    return f"{nonce},{SymmetricCryptoAbstraction(key).encrypt(nonce)}"
+
+
+def create_record(index_format: int):
+    return {
+        f"index:{keyword_number}: {index_number}": create_entry(index_format)
+        for keyword_number, wildcard_list in enumerate(generate_wildcard_list(NAMES))
+        for index_number, _ in enumerate(wildcard_list)
+    }
+
+
+def compare(index_format: int):
+    records = [create_record(index_format) for _ in range(AMOUNT_OF_RECORDS)]
+    field_bytes = memory_usage(records)
+    start = time.perf_counter()
+    grouped_records = [group_indices(record) for record in records]
+    parse_seconds = time.perf_counter() - start
+
+    packed_records = [pack_indices(grouped) for grouped in grouped_records]
+    packed_bytes = memory_usage(packed_records)
+    start = time.perf_counter()
+    unpacked_records = [unpack_indices(packed) for packed in packed_records]
+    unpack_seconds = time.perf_counter() - start
+    assert unpacked_records == grouped_records
+
+    print(f"index format {index_format}:")
+    print(f"  fields: {field_bytes} bytes, parsed in {parse_seconds:.4f} seconds")
+    print(f"  packed: {packed_bytes} bytes, unpacked in {unpack_seconds:.4f} seconds")
+    print(
+        f"  {field_bytes / packed_bytes:.1f}x smaller, "
+        f"{parse_seconds / unpack_seconds:.1f}x faster"
+    )
+
+
+for index_format in (LEGACY_INDEX_FORMAT, TAG_INDEX_FORMAT):
+    compare(index_format)
@@ -0,0 +1,42 @@
+"""Takes 10^7 pseudonyms from the allocator and counts the collisions among them.
+Runs in memory, no database needed"""
+import os, sys
+from array import array
+
+TESTS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(TESTS), "src", "vault"))
+
+from pseudonyms import PseudonymAllocator
+
+AMOUNT_OF_PSEUDONYMS = 10**7
+BATCH_SIZE = 10**5
+# a prefix of 12 characters fits into a signed 64 bit integer
+PREFIX_LENGTH = 12
+BUCKETS = 256
+
+
+def count_collisions() -> int:
+    allocator = PseudonymAllocator(pool_size=BATCH_SIZE)
+    # pseudonyms are compared by their prefix, bucketed to keep sorting cheap,
+    # a collision of 10^7 random prefixes is expected with a probability of 10^-5
+    buckets = [array("q") for _ in range(BUCKETS)]
+    for _ in range(AMOUNT_OF_PSEUDONYMS // BATCH_SIZE):
+        pseudonyms = allocator.take(BATCH_SIZE)
+        allocator.release(pseudonyms)
+        for pseudonym in pseudonyms:
+            prefix = int(pseudonym[:PREFIX_LENGTH], 36)
+            buckets[prefix % BUCKETS].append(prefix)
+    collisions = 0
+    for bucket in buckets:
+        prefixes = sorted(bucket)
+        collisions += sum(
+            previous == current for previous, current in zip(prefixes, prefixes[1:])
+        )
+    assert sum(len(bucket) for bucket in buckets) == AMOUNT_OF_PSEUDONYMS
+    return collisions
+
+
+if __name__ == "__main__":
+    collisions = count_collisions()
+    print(f"{collisions} collisions in {AMOUNT_OF_PSEUDONYMS} pseudonyms")
+    sys.exit(1 if collisions else 0)
@@ -0,0 +1,56 @@
+"""Compares the generation of pseudonyms with one secrets.choice call per character
+against bulk generation from os.urandom and against taking pseudonyms from a pool.
+Runs in memory, no database needed"""
+import os, sys, secrets, string, time
+
+TESTS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(TESTS), "src", "vault"))
+
+from pseudonyms import PSEUDONYM_LENGTH, PseudonymAllocator, generate_random_strings
+
+AMOUNTS = [1, 100, 10000]
+REPETITIONS = 20
+
+
+def secrets_choice(amount: int):
+    alphabet = string.ascii_uppercase + string.digits
+    return [
+        "".join(secrets.choice(alphabet) for _ in range(PSEUDONYM_LENGTH))
+        for _ in range(amount)
+    ]
+
+
+def bulk(amount: int):
+    return generate_random_strings(amount, PSEUDONYM_LENGTH)
+
+
+pool = PseudonymAllocator(pool_size=max(AMOUNTS))
+
+
+def pooled(amount: int):
+    # a record batch as added by /addRecords, refills are triggered like in the vault
+    pseudonyms = pool.take(amount)
+    pool.release(pseudonyms)
+    return pseudonyms
+
+
+def measure(generate, amount: int) -> float:
+    start = time.perf_counter()
+    for _ in range(REPETITIONS):
+        generate(amount)
+    return (time.perf_counter() - start) / REPETITIONS
+
+
+if __name__ == "__main__":
+    pool.refill()
+    for amount in AMOUNTS:
+        for name, generate in [
+            ("secrets.choice", secrets_choice),
+            ("bulk urandom", bulk),
+            ("pool", pooled),
+        ]:
+            seconds = measure(generate, amount)
+            print(
+                f"{name:15} {amount:6} pseudonyms: {seconds * 1000:9.3f} ms, "
+                f"{seconds / amount * 10**6:7.3f} µs per pseudonym"
+            )
@@ -0,0 +1,128 @@
+"""Counts the Redis round trips of a single vault search, once with the former
+per-record, per-token HSCAN approach, once for loading all indices with the pipelined
+bulk fetch and once for searching the resident snapshot.
+Needs a running vault database at API_DB and the redis storage backend"""
+import os, sys
+
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+        "src",
+        "vault",
+    )
+)
+
+from charm.toolbox.pairinggroup import G1
+from charm.toolbox.symcrypto import SymmetricCryptoAbstraction
+from constants import GROUP, PSEUDONYM_ENTRIES
+from db import storage
+from hashes import h
+from indices import SearchToken, is_match, parse_index
+from se import search
+from snapshot import snapshot
+from redis_storage import REGISTRY, register
+
+database = storage.database
+
+USER_ID = 4711
+AMOUNT_OF_RECORDS = 1000
+AMOUNT_OF_KEYWORDS = 3
+FIRST_RECORD_ID = 10**9
+
+
+class RoundTripCounter:
+    """Counts every connection checkout of the database client,
+    a single command or a complete pipeline each take one checkout"""
+
+    def __init__(self):
+        self.round_trips = 0
+        self._get_connection = database.connection_pool.get_connection
+
+    def __enter__(self):
+        def counting_get_connection(*args, **kwargs):
+            self.round_trips += 1
+            return self._get_connection(*args, **kwargs)
+
+        database.connection_pool.get_connection = counting_get_connection
+        return self
+
+    def __exit__(self, *args):
+        database.connection_pool.get_connection = self._get_connection
+
+
+def search_hscan(user_id, queries):
+    """Search as it was implemented before, one HSCAN per record and search token"""
+    com_k = GROUP.deserialize(database.get(user_id).encode(), compression=False)
+    decryption_keys = [
+        h(
+            GROUP,
+            GROUP.pair_prod(
+                GROUP.deserialize(query.encode(), compression=False), com_k
+            ),
+        )
+        for query in queries[0]
+    ]
+    results = []
+    for key in database.scan_iter(_type="HASH"):
+        query_hits = 0
+        for index_key in decryption_keys:
+            token = SearchToken(index_key)
+            for _, index in database.hscan_iter(key, "index:*"):
+                if is_match(token, parse_index(index)):
+                    query_hits += 1
+        if len(queries[0]) == query_hits and query_hits > 0:
+            results.append(
+                (database.hget(key, "record"), database.hget(key, "pseudonym"))
+            )
+    return results
+
+
+def init():
+    com_k = GROUP.random(G1)
+    database.set(USER_ID, GROUP.serialize(com_k, compression=False))
+    for record_id in range(AMOUNT_OF_RECORDS):
+        aes = SymmetricCryptoAbstraction(h(GROUP, GROUP.random(G1)))
+        mapping = {
+            f"index:0: {index_number}": f"RANDOMSTRING{index_number:04},"
+            + aes.encrypt(f"RANDOMSTRING{index_number:04}")
+            for index_number in range(AMOUNT_OF_KEYWORDS)
+        }
+        mapping["record"] = "record"
+        mapping["pseudonym"] = "pseudonym"
+        database.hset(
+            f"{PSEUDONYM_ENTRIES}:{FIRST_RECORD_ID + record_id}", mapping=mapping
+        )
+    pipe = database.pipeline()
+    register(
+        pipe, [FIRST_RECORD_ID + record_id for record_id in range(AMOUNT_OF_RECORDS)]
+    )
+    pipe.execute()
+    return [
+        [
+            GROUP.serialize(GROUP.random(G1), compression=False).decode()
+            for _ in range(AMOUNT_OF_KEYWORDS)
+        ]
+    ]
+
+
+def cleanup():
+    database.delete(USER_ID)
+    for record_id in range(AMOUNT_OF_RECORDS):
+        database.delete(f"{PSEUDONYM_ENTRIES}:{FIRST_RECORD_ID + record_id}")
+        database.zrem(REGISTRY, FIRST_RECORD_ID + record_id)
+    snapshot.rebuild()
+
+
+queries = init()
+try:
+    with RoundTripCounter() as before:
+        search_hscan(USER_ID, queries)
+    with RoundTripCounter() as loading:
+        snapshot.rebuild()
+    with RoundTripCounter() as after:
+        search(USER_ID, queries)
+finally:
+    cleanup()
+print(f"round trips per search before: {before.round_trips}")
+print(f"round trips for loading all indices pipelined: {loading.round_trips}")
+print(f"round trips per search after: {after.round_trips}")
@@ -0,0 +1,38 @@
+from collections import Counter
+from pseudonyms import (
+    ALPHABET,
+    PSEUDONYM_LENGTH,
+    PseudonymAllocator,
+    generate_random_strings,
+)
+
+
+def test_characters_are_uniformly_distributed():
+    counts = Counter("".join(generate_random_strings(10**6, PSEUDONYM_LENGTH)))
+    expected = 10**6 * PSEUDONYM_LENGTH / len(ALPHABET)
+    assert set(counts) == set(ALPHABET)
+    # a modulo bias would favor the first characters by 14%
+    assert all(abs(count - expected) < 0.01 * expected for count in counts.values())
+
+
+def test_assigned_pseudonyms_are_never_handed_out():
+    # 3 characters allow 46656 pseudonyms, so that collisions happen constantly
+    assigned = set()
+    allocator = PseudonymAllocator(
+        lambda pseudonyms: [1 if p in assigned else None for p in pseudonyms],
+        pool_size=1000,
+        length=3,
+    )
+    for _ in range(30):
+        pseudonyms = allocator.take(1000)
+        assert len(set(pseudonyms)) == 1000
+        assert assigned.isdisjoint(pseudonyms)
+        assigned.update(pseudonyms)
+        allocator.release(pseudonyms)
+    assert len(assigned) == 30000
+
+
+def test_pseudonyms_have_the_configured_length():
+    pseudonyms = PseudonymAllocator(pool_size=100).take(100)
+    assert all(len(pseudonym) == PSEUDONYM_LENGTH for pseudonym in pseudonyms)
+    assert len(set(pseudonyms)) == 100
@@ -0,0 +1,107 @@
+import pytest
+import matching
+import results
+import se
+from constants import TAG_INDEX_FORMAT
+from hashes import index_tag
+from local_storage import LocalStorage
+from snapshot import IndexSnapshot
+
+USER_ID = 1
+KEY = b"k" * 16
+OTHER_KEY = b"o" * 16
+
+
+def indices(record_id: int, key: bytes = KEY) -> tuple:
+    nonce = str(record_id).encode()
+    return (((TAG_INDEX_FORMAT, nonce, index_tag(key, nonce)),),)
+
+
+def search(limit=None, user_id=USER_ID) -> tuple:
+    return ([[KEY]], False, 1, limit, user_id)
+
+
+def run(*searches):
+    return matching.merge_matches(results.iter_cached_matches(list(searches)), 1)[0]
+
+
+@pytest.fixture(name="snapshot")
+def fixture_snapshot(monkeypatch):
+    snapshot = IndexSnapshot()
+    monkeypatch.setattr(matching, "snapshot", snapshot)
+    monkeypatch.setattr(results, "snapshot", snapshot)
+    results.results.clear()
+    return snapshot
+
+
+@pytest.fixture(name="checked_ids")
+def fixture_checked_ids(monkeypatch):
+    checked_ids = []
+    is_match = matching.is_match
+
+    def counting_is_match(token, index):
+        checked_ids.append(int(index[1]))
+        return is_match(token, index)
+
+    monkeypatch.setattr(matching, "is_match", counting_is_match)
+    return checked_ids
+
+
+def test_repeated_search_only_checks_new_records(snapshot, checked_ids):
+    snapshot.add(1, indices(1))
+    snapshot.add(2, indices(2, OTHER_KEY))
+    assert run(search()) == [1]
+    snapshot.add(3, indices(3))
+    checked_ids.clear()
+    assert run(search()) == [1, 3]
+    assert checked_ids == [3]
+    checked_ids.clear()
+    assert run(search()) == [1, 3]
+    assert not checked_ids
+
+
+def test_record_added_below_the_largest_id_invalidates_results(snapshot, checked_ids):
+    snapshot.add(1, indices(1))
+    snapshot.add(3, indices(3))
+    assert run(search()) == [1, 3]
+    # a concurrent writer finished after a record with a larger id
+    snapshot.add(2, indices(2))
+    checked_ids.clear()
+    assert run(search()) == [1, 2, 3]
+    assert checked_ids == [1, 2, 3]
+
+
+def test_limited_searches_are_not_cached(snapshot):
+    for record_id in range(1, 5):
+        snapshot.add(record_id, indices(record_id))
+    assert run(search(limit=2)) == [1, 2]
+    assert results.results.get(results.result_key(search())) is None
+    assert run(search()) == [1, 2, 3, 4]
+
+
+def test_limited_searches_use_trimmed_cached_results(snapshot, checked_ids):
+    for record_id in range(1, 4):
+        snapshot.add(record_id, indices(record_id))
+    assert run(search()) == [1, 2, 3]
+    checked_ids.clear()
+    assert run(search(limit=2)) == [1, 2]
+    assert not checked_ids
+    snapshot.add(4, indices(4))
+    assert run(search(limit=4)) == [1, 2, 3, 4]
+    assert checked_ids == [4]
+    # the limited search didn't replace the cached result
+    assert list(results.results.get(results.result_key(search()))[0]) == [1, 2, 3]
+
+
+def test_revoking_access_removes_only_the_results_of_the_user(
+    snapshot, tmp_path, monkeypatch
+):
+    storage = LocalStorage(str(tmp_path))
+    storage.set_user_key(USER_ID, "complementary key")
+    monkeypatch.setattr(se, "storage", storage)
+    snapshot.add(1, indices(1))
+    run(search())
+    run(search(user_id=2))
+    se.revoke_access(USER_ID)
+    assert results.results.get(results.result_key(search())) is None
+    assert results.results.get(results.result_key(search(user_id=2))) is not None
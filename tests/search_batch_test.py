@@ -0,0 +1,57 @@
+from fastapi import HTTPException
+import api
+import se
+from models import BatchSearchRequest, SearchRequest
+
+USER_ID = 1
+REVOKED_USER_ID = 2
+KEY = b"k" * 16
+
+
+def search_request(user_id: int) -> SearchRequest:
+    return SearchRequest(
+        user_id=user_id,
+        queries=[["query"]],
+        is_fuzzy=False,
+        expected_amount_of_keywords=1,
+    )
+
+
+def get_search_keys(user_id, queries):
+    if user_id != USER_ID:
+        raise HTTPException(status_code=403, detail="User is not authorized to search")
+    return [[KEY for _ in query_list] for query_list in queries]
+
+
+def test_unauthorized_user_only_fails_its_own_search(monkeypatch):
+    executed = []
+
+    def search_all(searches):
+        executed.extend(searches)
+        return [[("record", f"pseudonym {index}")] for index in range(len(searches))]
+
+    monkeypatch.setattr(se, "get_search_keys", get_search_keys)
+    monkeypatch.setattr(api, "search_all", search_all)
+    request = BatchSearchRequest(
+        requests=[
+            search_request(USER_ID),
+            search_request(REVOKED_USER_ID),
+            search_request(USER_ID),
+        ]
+    )
+    assert api.search_records_batch(request) == [
+        [("record", "pseudonym 0")],
+        None,
+        [("record", "pseudonym 1")],
+    ]
+    assert [search[4] for search in executed] == [USER_ID, USER_ID]
+
+
+def test_batch_of_unauthorized_users_doesnt_search(monkeypatch):
+    def search_all(searches):
+        raise AssertionError("no search is authorized")
+
+    monkeypatch.setattr(se, "get_search_keys", get_search_keys)
+    monkeypatch.setattr(api, "search_all", search_all)
+    request = BatchSearchRequest(requests=[search_request(REVOKED_USER_ID)])
+    assert api.search_records_batch(request) == [None]
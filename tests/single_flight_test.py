@@ -0,0 +1,111 @@
+import threading
+import time
+import pytest
+from redis.exceptions import LockError
+
+SEED = b"seed"
+
+
+class FakeLock:
+    def __init__(self, acquired=True, expired=False):
+        self.acquired = acquired
+        self.expired = expired
+        self.released = False
+
+    def acquire(self):
+        return self.acquired
+
+    def release(self):
+        if self.expired:
+            raise LockError("expired")
+        self.released = True
+
+
+class FakeDB:
+    def __init__(self, lock):
+        self.lock_names = []
+        self._lock = lock
+
+    def lock(self, name, **_):
+        self.lock_names.append(name)
+        return self._lock
+
+
+@pytest.fixture(name="single_flight")
+def fixture_single_flight(client_backend, monkeypatch):
+    single_flight = client_backend("single_flight")
+    monkeypatch.setattr(single_flight, "DB", FakeDB(FakeLock()))
+    return single_flight
+
+
+def test_request_key(single_flight):
+    key = single_flight.request_key(SEED, ["Alice", "Smith"], True, 1)
+    assert key == single_flight.request_key(SEED, ["Alice", "Smith"], True, 1)
+    # the keywords are searched and added exactly as given
+    assert key != single_flight.request_key(SEED, ["Smith", "Alice"], True, 1)
+    assert key != single_flight.request_key(SEED, ["Alice ", "Smith"], True, 1)
+    assert key != single_flight.request_key(SEED, ["Alice", "Smith"], False, 1)
+    assert key != single_flight.request_key(b"other seed", ["Alice", "Smith"], True, 1)
+
+
+def test_run_once_shares_the_result_of_a_running_request(single_flight):
+    started = threading.Event()
+    finish = threading.Event()
+    calls = []
+
+    def search():
+        calls.append(1)
+        started.set()
+        finish.wait(5)
+        return "pseudonym"
+
+    results = []
+    leader = threading.Thread(
+        target=lambda: results.append(single_flight.run_once("key", search))
+    )
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(
+        target=lambda: results.append(single_flight.run_once("key", search))
+    )
+    follower.start()
+    # the follower waits for the result of the leader
+    time.sleep(0.1)
+    finish.set()
+    leader.join(5)
+    follower.join(5)
+    assert results == ["pseudonym", "pseudonym"]
+    assert len(calls) == 1
+    assert not single_flight._in_flight  # pylint: disable=protected-access
+    # finished requests run again
+    assert single_flight.run_once("key", lambda: "again") == "again"
+
+
+def test_run_once_shares_exceptions(single_flight):
+    def fail():
+        raise ValueError("vault unavailable")
+
+    with pytest.raises(ValueError):
+        single_flight.run_once("key", fail)
+    assert not single_flight._in_flight  # pylint: disable=protected-access
+
+
+def test_run_locked_holds_the_lock_of_the_request(single_flight):
+    lock = single_flight.DB._lock  # pylint: disable=protected-access
+    assert single_flight._run_locked("key", lambda: "result") == "result"
+    assert single_flight.DB.lock_names == [f"users:{single_flight.MY_ID}:requests:key"]
+    assert lock.released
+
+
+def test_run_locked_runs_anyway_after_a_lock_timeout(single_flight, monkeypatch):
+    lock = FakeLock(acquired=False)
+    monkeypatch.setattr(single_flight, "DB", FakeDB(lock))
+    # pylint: disable=protected-access
+    assert single_flight._run_locked("key", lambda: "result") == "result"
+    assert not lock.released
+
+
+def test_run_locked_ignores_an_expired_lock(single_flight, monkeypatch):
+    monkeypatch.setattr(single_flight, "DB", FakeDB(FakeLock(expired=True)))
+    # pylint: disable=protected-access
+    assert single_flight._run_locked("key", lambda: "result") == "result"
@@ -0,0 +1,66 @@
+import snapshot as snapshot_module
+from local_storage import LocalStorage
+from snapshot import IndexSnapshot
+
+INDICES = (((2, b"nonce", b"tag"),),)
+
+
+def write(storage, record_id):
+    storage.write_records([(record_id, f"P{record_id}", "record", INDICES)])
+
+
+def test_sync_loads_records_written_below_the_largest_id(tmp_path, monkeypatch):
+    storage = LocalStorage(str(tmp_path))
+    monkeypatch.setattr(snapshot_module, "storage", storage)
+    api_snapshot = IndexSnapshot()
+    worker_snapshot = IndexSnapshot()
+    storage.reserve_ids(10)
+    write(storage, 10)
+    api_snapshot.add(10, INDICES)
+    assert worker_snapshot.sync(10, api_snapshot.generation) == 1
+    # a concurrent writer finishes after a record with a larger id
+    write(storage, 9)
+    api_snapshot.add(9, INDICES)
+    assert worker_snapshot.sync(10, api_snapshot.generation) == 1
+    assert worker_snapshot.record_ids() == [9, 10]
+    assert worker_snapshot.generation == api_snapshot.generation
+
+
+def test_sync_within_a_generation_only_loads_larger_ids(tmp_path, monkeypatch):
+    storage = LocalStorage(str(tmp_path))
+    monkeypatch.setattr(snapshot_module, "storage", storage)
+    worker_snapshot = IndexSnapshot()
+    storage.reserve_ids(3)
+    write(storage, 1)
+    write(storage, 2)
+    assert worker_snapshot.sync(2) == 2
+    write(storage, 3)
+    assert worker_snapshot.sync(3, worker_snapshot.generation) == 1
+    assert worker_snapshot.record_ids() == [1, 2, 3]
+
+
+def test_records_added_during_a_rebuild_are_kept(tmp_path, monkeypatch):
+    storage = LocalStorage(str(tmp_path))
+    monkeypatch.setattr(snapshot_module, "storage", storage)
+    snapshot = IndexSnapshot()
+    storage.reserve_ids(3)
+    write(storage, 1)
+    write(storage, 2)
+    load_indices = storage.load_indices
+
+    def load_indices_and_add(record_ids, *args):
+        # records are added while the rebuild is loading
+        write(storage, 3)
+        snapshot.add(3, INDICES)
+        snapshot.add(2, INDICES)
+        assert snapshot.record_ids() == [2, 3]
+        yield from load_indices(record_ids, *args)
+
+    monkeypatch.setattr(storage, "load_indices", load_indices_and_add)
+    assert snapshot.rebuild() == 3
+    assert snapshot.record_ids() == [1, 2, 3]
+    monkeypatch.setattr(storage, "load_indices", load_indices)
+    assert list(snapshot.records()) == [(1, INDICES), (2, INDICES), (3, INDICES)]
+    # a record written before the rebuild is only listed once
+    snapshot.add(2, INDICES)
+    assert snapshot.record_ids() == [1, 2, 3]
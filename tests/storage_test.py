@@ -0,0 +1,82 @@
+import os
+import pytest
+from local_storage import INDEX_HEADER, LocalStorage
+
+INDICES = (((2, b"nonce", b"tag"), (1, b"random", b"iv and ciphertext")), ())
+
+
+def stored_record(record_id: int) -> tuple:
+    return (record_id, f"P{record_id}", f"record {record_id}", INDICES)
+
+
+@pytest.fixture(name="storage", params=["local", "redis"])
+def fixture_storage(request, tmp_path):
+    if request.param == "local":
+        return LocalStorage(str(tmp_path))
+    return request.getfixturevalue("redis_storage")
+
+
+def test_records(storage):
+    storage.prepare()
+    assert storage.reserve_ids(3) == 3
+    storage.write_records([stored_record(1), stored_record(3)])
+    assert storage.record_count() == 2
+    # records finishing out of order are still enumerated in ascending order
+    storage.write_records([stored_record(2)])
+    assert list(storage.record_ids()) == [1, 2, 3]
+    assert list(storage.record_ids(2)) == [2, 3]
+    assert list(storage.record_ids(last_id=2)) == [1, 2]
+    assert list(storage.load_indices([3, 4, 1])) == [(3, INDICES), (1, INDICES)]
+    assert storage.fetch_records([2, 1]) == [("record 2", "P2"), ("record 1", "P1")]
+    assert storage.find_record_ids(["P3", "unknown"]) == [3, None]
+    assert storage.reserve_ids(2) == 5
+
+
+def test_user_keys(storage):
+    assert storage.get_user_key(1) is None
+    assert storage.set_user_key(1, "first key")
+    assert storage.set_user_key(2, "second key")
+    assert storage.set_user_key(1, "new key")
+    assert storage.get_user_key(1) == "new key"
+    assert storage.delete_user_key(2)
+    assert not storage.delete_user_key(2)
+    assert sorted(storage.user_keys()) == [(1, "new key")]
+
+
+def test_local_index_segments_roll_over(tmp_path):
+    storage = LocalStorage(str(tmp_path), segment_size=1)
+    storage.reserve_ids(3)
+    for record_id in range(1, 4):
+        storage.write_records([stored_record(record_id)])
+    assert len([name for name in os.listdir(tmp_path) if name.endswith(".seg")]) == 3
+    reopened = LocalStorage(str(tmp_path), segment_size=1)
+    assert list(reopened.load_indices([1, 2, 3])) == [
+        (record_id, INDICES) for record_id in range(1, 4)
+    ]
+
+
+def test_local_storage_reopens_after_a_truncated_tail(tmp_path):
+    storage = LocalStorage(str(tmp_path))
+    storage.reserve_ids(2)
+    storage.write_records([stored_record(1)])
+    # a writer crashed in the middle of an index entry
+    with open(tmp_path / "index-000000.seg", "ab") as segment:
+        segment.write(INDEX_HEADER.pack(2, 100) + b"partial")
+    reopened = LocalStorage(str(tmp_path))
+    assert list(reopened.record_ids()) == [1]
+    reopened.write_records([stored_record(2)])
+    assert list(LocalStorage(str(tmp_path)).load_indices([1, 2])) == [
+        (1, INDICES),
+        (2, INDICES),
+    ]
+
+
+def test_redis_users_written_before_the_user_set_are_registered(redis_storage):
+    redis_storage.database.set(1, "former key")
+    redis_storage.database.set("pseudonym-entry-unrelated", "value")
+    assert list(redis_storage.user_keys()) == []
+    redis_storage.prepare()
+    assert list(redis_storage.user_keys()) == [(1, "former key")]
+    redis_storage.set_user_key(2, "new key")
+    redis_storage.prepare()
+    assert sorted(redis_storage.user_keys()) == [(1, "former key"), (2, "new key")]